@@ -1,32 +1,163 @@
 from dataclasses import dataclass
+import os
+import re
+import shlex
+import selectors
 import subprocess as sp
+import tempfile
 
 from gamuLogger import Logger
 
+from .utils import GREY, RED, RESET
 
-@dataclass
+
+@dataclass(slots=True)
 class CommandMetaData:
     always_run: bool = False # If true, the command will always run regardless of failures in previous commands
     silent: bool = False     # If true, the command's output will be suppressed
+
+def _open_pidfd(pid: int) -> int | None:
+    """Open a pidfd for the given process, or return None if unsupported (non-Linux or kernel < 5.3)."""
+    if not hasattr(os, 'pidfd_open'):
+        return None
+    try:
+        return os.pidfd_open(pid)
+    except OSError:
+        return None
+
+HAS_POSIX_SPAWN = hasattr(os, 'posix_spawn') # run_command falls back to subprocess without it
+SHELL_CHARS_RE = re.compile(r'[|&;<>()$`\\*?\[\]#~{}\n]') # characters only the shell can interpret
+SHELL_BUILTINS = frozenset({'.', ':', 'alias', 'break', 'cd', 'continue', 'eval', 'exec', 'exit', 'export',
+                            'read', 'readonly', 'return', 'set', 'shift', 'source', 'trap', 'ulimit', 'umask',
+                            'unset', 'wait'})
+
+def _split_command(command: str) -> list[str] | None:
+    """Split a command into the arguments of the program to run, or return None if it needs a shell
+    (operators, redirections, expansions, globs, variable assignments or shell builtins)."""
+    if SHELL_CHARS_RE.search(command):
+        return None
+    try:
+        argv = shlex.split(command)
+    except ValueError: # unbalanced quotes, let the shell report it
+        return None
+    if not argv or argv[0] in SHELL_BUILTINS or '=' in argv[0]:
+        return None
+    return argv
+
+def _popen(command: str, cwd: str | None = None, **kwargs) -> sp.Popen:
+    """Start a command, executing its program directly instead of through /bin/sh when possible."""
+    argv = _split_command(command)
+    if argv is not None:
+        try:
+            return sp.Popen(argv, cwd=cwd, **kwargs)
+        except OSError: # e.g. program not found, let the shell report it the usual way
+            pass
+    return sp.Popen(command, shell=True, cwd=cwd, **kwargs)
+
+def _spawn_silent(command: str, cwd: str | None = None):
+    """Run a command in `cwd`, discarding its output; commands needing a shell are started with a single
+    posix_spawn call. stderr goes to a temporary file instead of a pipe, so nothing has to be drained while it runs."""
+    with tempfile.TemporaryFile() as err_file:
+        if _split_command(command) is not None:
+            # no shell needed: subprocess can exec the program directly in cwd, which posix_spawn can't
+            returncode = _popen(command, cwd, stdout=sp.DEVNULL, stderr=err_file).wait()
+        else:
+            file_actions = [
+                (os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_WRONLY, 0),
+                (os.POSIX_SPAWN_DUP2, err_file.fileno(), 2),
+            ]
+            argv = ['/bin/sh', '-c', command]
+            if cwd is not None: # posix_spawn can't change directory before Python 3.13, so the shell does it
+                argv = ['/bin/sh', '-c', 'cd -- "$1" && eval "$2"', 'sh', cwd, command]
+            pid = os.posix_spawn('/bin/sh', argv, os.environ, file_actions=file_actions)
+            _, status = os.waitpid(pid, 0)
+            returncode = os.waitstatus_to_exitcode(status)
+        if returncode != 0:
+            err_file.seek(0)
+            stderr = err_file.read().decode('utf-8', errors='replace').strip()
+            raise sp.CalledProcessError(returncode, command, stderr=stderr)
+
+def run_command(command: str, log: bool, cwd: str | None = None):
+    """Run a shell command in `cwd`, draining stdout and stderr as they become readable.
+    Complete lines are logged if `log` is true; stderr is always kept for the raised error."""
+    if not log and HAS_POSIX_SPAWN:
+        return _spawn_silent(command, cwd)
+    
+    process = _popen(command, cwd, stdout=sp.PIPE, stderr=sp.PIPE)
+    assert process.stdout is not None and process.stderr is not None
+    
+    buffers = {'out': bytearray(), 'err': bytearray()}
+    err_data = bytearray()
+    
+    sel = selectors.DefaultSelector()
+    for stream, tag in ((process.stdout, 'out'), (process.stderr, 'err')):
+        os.set_blocking(stream.fileno(), False)
+        sel.register(stream.fileno(), selectors.EVENT_READ, tag)
+    
+    # When available, the pidfd makes the child's exit a selector event, so we can block
+    # without a timeout; otherwise, wake up periodically until both pipes reach EOF.
+    pidfd = _open_pidfd(process.pid)
+    timeout = 0.1
+    if pidfd is not None:
+        sel.register(pidfd, selectors.EVENT_READ, 'pid')
+        timeout = None
+    
+    def log_lines(tag: str, data: bytes):
+        for line in data.decode('utf-8', errors='replace').split('\n'):
+            log_line(tag, line)
+    
+    def log_line(tag: str, line: str):
+        text = line.rstrip()
+        if not text:
+            return
+        if tag == 'err':
+            Logger.info(RED + text + RESET)
+        else:
+            Logger.info(text)
+    
+    try:
+        while sel.get_map():
+            events = sel.select(timeout)
+            if not events and timeout == 0:
+                break
+            for key, _ in events:
+                if key.data == 'pid':
+                    # child exited: drain what is left without waiting on pipes inherited by its children
+                    sel.unregister(key.fd)
+                    timeout = 0
+                    continue
+                chunk = os.read(key.fd, 65536)
+                if not chunk:
+                    sel.unregister(key.fd)
+                    continue
+                if key.data == 'err':
+                    err_data += chunk
+                if not log:
+                    continue
+                buf = buffers[key.data]
+                buf += chunk
+                # decode and split all complete lines of the chunk at once, keep the partial last line
+                end = buf.rfind(b'\n')
+                if end != -1:
+                    log_lines(key.data, bytes(buf[:end]))
+                    del buf[:end + 1]
+    finally:
+        sel.close()
+        if pidfd is not None:
+            os.close(pidfd)
+        process.stdout.close()
+        process.stderr.close()
     
-def run_command(command: str, log: bool):
-    process = sp.Popen(command, shell=True, stdout=sp.PIPE, stderr=sp.PIPE, text=True)
-    while process.poll() is None:
-        if log:
-            if process.stdout is not None:
-                log_lines = process.stdout.readline().strip()
-                for log_line in log_lines.splitlines():
-                    Logger.info(log_line)
     if log:
-        if process.stdout is not None:
-            logs = process.stdout.read().strip()
-            for log_line in logs.splitlines():
-                Logger.info(log_line)
+        for tag, buf in buffers.items():
+            if buf:
+                log_lines(tag, bytes(buf))
+    
+    process.wait()
     if process.returncode != 0:
-        stderr = process.stderr.read().strip() if process.stderr is not None else ''
+        stderr = err_data.decode('utf-8', errors='replace').strip()
         raise sp.CalledProcessError(process.returncode, command, stderr=stderr)
-        
-    
+
 
 class CommandExecutionError(Exception):
     pass
@@ -36,11 +167,12 @@ class Command:
         self.metadata = CommandMetaData()
         
         cmd = raw_command.strip()
+        parts = cmd.split()
         nb_macros = 0
-        for token in cmd.split():
-            token = token.strip().lower()
+        for token in parts:
             if not token.startswith('+'):
                 break
+            token = token.lower()
             nb_macros += 1
             if token == '+always':
                 Logger.trace(f'Found +always token in command: {cmd}')
@@ -51,15 +183,15 @@ class Command:
             else:
                 Logger.warning(f'Unknown preprocessor token in command: {token}. skipping.')
         
-        self.command = ' '.join(cmd.split()[nb_macros:])
+        self.command = ' '.join(parts[nb_macros:])
         
-    def execute(self):
-        Logger.debug(f'Executing command: \033[30m{self.command}\033[0m')
+    def execute(self, cwd: str | None = None):
+        Logger.debug(f'Executing command: {GREY}{self.command}{RESET}')
         try:
-            run_command(self.command, not self.metadata.silent)
+            run_command(self.command, not self.metadata.silent, cwd)
         except sp.CalledProcessError as e:
             if self.metadata.silent:
-                Logger.error(f'Command failed with return code {e.returncode}:\033[31m\n{e.stderr.strip()}\033[0m')
+                Logger.error(f'Command failed with return code {e.returncode}:{RED}\n{e.stderr.strip()}{RESET}')
             else:
                 Logger.error(f'Command failed with return code {e.returncode}.')
             raise CommandExecutionError() from e
\ No newline at end of file
@@ -1,6 +1,7 @@
 import cmd
 from gamuLogger import Logger
 from .project import Project
+from .utils import RED, RESET
 
 
 class InteractiveShell(cmd.Cmd):
@@ -24,16 +25,29 @@ class InteractiveShell(cmd.Cmd):
         super().__init__()
         self.project = project
         self.rules_dict = project.get_all_rules()
+        self._rule_names = list(self.rules_dict.keys())
+    
+    def _complete_rule_name(self, text):
+        """Complete a rule name from the names fetched at startup."""
+        return [name for name in self._rule_names if name.startswith(text)]
+    
+    def complete_run(self, text, line, begidx, endidx):
+        """Complete rule names for the run command."""
+        return self._complete_rule_name(text)
+    
+    def complete_info(self, text, line, begidx, endidx):
+        """Complete rule names for the info command."""
+        return self._complete_rule_name(text)
     
     def do_list(self, arg):
         """List all available rules. Usage: list"""
-        if not self.project.get_all_rules():
+        if not self.rules_dict:
             print("No rules available.")
             return
         
         print(f"\n{'Rule Name':<30} {'Tags':<30} {'Commands':<10}")
         print("-" * 70)
-        for name, rule in self.project.get_all_rules().items():
+        for name, rule in self.rules_dict.items():
             tags_str = ', '.join(rule.tags) if rule.tags else '-'
             print(f"{name:<30} {tags_str:<30} {len(rule.commands):<10}")
     
@@ -52,7 +66,7 @@ class InteractiveShell(cmd.Cmd):
         
         for rule_name in rule_names:
             if rule_name not in self.rules_dict:
-                print(f"\033[31mRule not found: {rule_name}\033[0m")
+                print(f"{RED}Rule not found: {rule_name}{RESET}")
                 print("Available rules: " + ', '.join(self.rules_dict.keys()))
                 return
         
@@ -73,7 +87,7 @@ class InteractiveShell(cmd.Cmd):
         rule_name = arg.strip()
         
         if rule_name not in self.rules_dict:
-            print(f"\033[31mRule not found: {rule_name}\033[0m")
+            print(f"{RED}Rule not found: {rule_name}{RESET}")
             print("Available rules: " + ', '.join(self.rules_dict.keys()))
             return
         
@@ -93,7 +107,7 @@ class InteractiveShell(cmd.Cmd):
                 value = self.project.vars[var_name]
                 print(f"{var_name} = {value}")
             else:
-                print(f"\033[31mVariable not found: {var_name}\033[0m")
+                print(f"{RED}Variable not found: {var_name}{RESET}")
                 print("Available variables: " + ', '.join(self.project.vars.keys()))
         print()
     
@@ -114,7 +128,7 @@ class InteractiveShell(cmd.Cmd):
         """Handle unknown commands."""
         if line in ('EOF', 'q'):
             self.do_exit(line)
-        print(f"\033[31mUnknown command: {line}\033[0m")
+        print(f"{RED}Unknown command: {line}{RESET}")
         print("Type 'help' for available commands.")
     
     def emptyline(self):
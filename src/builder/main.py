@@ -1,6 +1,7 @@
 import os
 import sys
 import argparse
+import functools
 import traceback
 
 from gamuLogger import Logger, config_argparse, config_logger
@@ -8,7 +9,9 @@ from gamuLogger import Logger, config_argparse, config_logger
 from .project import Project
 from .interactive_shell import InteractiveShell
         
-def main():
+@functools.cache
+def _get_parser() -> argparse.ArgumentParser:
+    """Build the command line parser, once per process."""
     argparser = argparse.ArgumentParser(description='Build automation tool.')
     argparser.add_argument('--config', '-c', type=str, default="build.yml", help='Path to the build configuration file (YAML format).')
     argparser.add_argument('rules', nargs='*', help='Specific rules to execute. If none provided, all rules will be executed. Support regular expressions.')
@@ -17,9 +20,13 @@ def main():
     argparser.add_argument('--variable', '-D', action='append', help='Define a variable, two formats are allowed: NAME=VALUE, or NAME, in which case VALUE is taken from the environment variable NAME (not that this cause VALUE to be empty if NAME is not defined in the environment).', default=[])
     argparser.add_argument('--force-reload', '--force', '-f', action='store_true', help='Force reloading of all files, ignoring any caches.')
     argparser.add_argument('--interactive', '-i', action='store_true', help='Run in interactive mode.')
+    argparser.add_argument('--jobs', '-j', type=int, default=1, help='Number of rules to run in parallel (0 to use one per CPU). Rules wait for the rules listed in their depends-on field, and for the rules expecting the files they require.')
     config_argparse(argparser)
-    
-    args = argparser.parse_args()
+    return argparser
+
+
+def main():
+    args = _get_parser().parse_args()
     config_logger(args)
     
     rules_patterns = args.rules if args.rules else []
@@ -36,7 +43,7 @@ def main():
         Logger.debug(f'Defined variable from command line: {name}={value}')
     
     try:
-        project = Project(args.config, variables)
+        project = Project(args.config, variables, force_reload=args.force_reload)
     except Exception as e:
         Logger.fatal(f'Failed to load project: {e}')
         sys.exit(1)
@@ -56,7 +63,7 @@ def main():
         sys.exit(0)
         
     try:
-        project.run(rules, force=args.force_reload)
+        project.run(rules, force=args.force_reload, jobs=args.jobs)
     except Exception as e:
         Logger.fatal(f'Build failed: {e.__class__.__name__}: {e}')
         Logger.debug(traceback.format_exc())
@@ -3,24 +3,198 @@ import os
 import sys
 import subprocess as sp
 import re
-from typing import Any
+import shlex
+import atexit
+import tempfile
+import threading
+import uuid
+import functools
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Any, Iterator
 
 from gamuLogger import Logger
 
 from .rule import Rule
 from .uses import load_project_file, is_project_file
 
-from .utils import flatten, list2str
+from .utils import flatten, list2str, glob_files, load_cached, VAR_RE, GREY, GREEN, YELLOW, RESET
 
+try: # prefer the libyaml parser when PyYAML was built with it
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+MAX_RESOLVE_ITER = 100 # substitution passes on a single value, for values that keep growing (e.g. A: ${A}x)
+
+def _find_commands(value: str) -> Iterator[tuple[int, int, str]]:
+    """Find the $(command) expansions of a value, in one pass. Yield the start and end (exclusive) of each one
+    with its command; nested expansions are part of the outer command, and are left to the shell running it."""
+    start = value.find('$(')
+    while start != -1:
+        depth = 0
+        for end in range(start + 1, len(value)):
+            if value[end] == '(':
+                depth += 1
+            elif value[end] == ')':
+                depth -= 1
+                if depth == 0:
+                    break
+        else:
+            return # unterminated expansion, kept as it is
+        yield start, end + 1, value[start + 2:end]
+        start = value.find('$(', end + 1)
+
+
+class _ShellSession:
+    """A long-lived /bin/sh running commands one after another, so each one costs a subshell fork
+    instead of spawning a new shell. Commands are evaluated in a subshell, with stdin from /dev/null and
+    stderr written to a temporary file, so they can't alter the session, read its input or break its parsing."""
+    def __init__(self):
+        self.marker = f'__BUILDER_{uuid.uuid4().hex}__'
+        fd, self.stderr_file = tempfile.mkstemp(prefix='builder-')
+        os.close(fd)
+        self.process = sp.Popen(['/bin/sh'], stdin=sp.PIPE, stdout=sp.PIPE, text=True, errors='replace')
+    
+    def run(self, command: str) -> str:
+        """Run a command and return its output. Raise EOFError if the shell exited (e.g. on a syntax error)."""
+        assert self.process.stdin is not None and self.process.stdout is not None
+        script = f"( eval {shlex.quote(command)} ) </dev/null 2>{shlex.quote(self.stderr_file)}\nprintf '\\n{self.marker}%d\\n' $?\n"
+        try:
+            self.process.stdin.write(script)
+            self.process.stdin.flush()
+        except BrokenPipeError as e:
+            raise EOFError from e
+        lines = []
+        while not (line := self.process.stdout.readline()).startswith(self.marker):
+            if not line:
+                raise EOFError
+            lines.append(line)
+        output = ''.join(lines)[:-1] # drop the newline printed before the marker
+        returncode = int(line[len(self.marker):])
+        if returncode != 0:
+            with open(self.stderr_file, 'r', errors='replace') as file:
+                raise sp.CalledProcessError(returncode, command, output=output, stderr=file.read())
+        return output
+    
+    def close(self, kill : bool = False):
+        """Stop the shell; `kill` it if it may still be running a command, e.g. after a failed read of its output."""
+        if kill:
+            self.process.kill()
+        try:
+            if self.process.stdin is not None:
+                self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.process.wait()
+        if self.process.stdout is not None:
+            self.process.stdout.close()
+        os.remove(self.stderr_file)
+
+
+_idle_shells : list[_ShellSession] = []
+_idle_shells_lock = threading.Lock()
+
+
+@atexit.register
+def _close_shells():
+    with _idle_shells_lock:
+        while _idle_shells:
+            _idle_shells.pop().close()
+
+
+def _shell_output(command: str) -> str:
+    """Run a command in an idle shell session (a new one is started when all are busy)."""
+    if os.name != 'posix':
+        return sp.check_output(command, shell=True, text=True, stderr=sp.PIPE)
+    with _idle_shells_lock:
+        session = _idle_shells.pop() if _idle_shells else None
+    if session is None:
+        session = _ShellSession()
+    try:
+        return session.run(command)
+    except sp.CalledProcessError:
+        raise # the command failed, but its output was read up to the marker: the session can be reused
+    except EOFError:
+        # the session is lost; run the command on its own to get its actual result
+        session.close()
+        session = None
+        return sp.check_output(command, shell=True, text=True, stderr=sp.PIPE)
+    except BaseException:
+        # the rest of the command's output may still be in the pipe, where the next command would read it
+        session.close(kill=True)
+        session = None
+        raise
+    finally:
+        if session is not None:
+            with _idle_shells_lock:
+                _idle_shells.append(session)
+
+
+@functools.lru_cache(maxsize=None)
+def _run_shell(command: str) -> str:
+    """Run a `$(command)` expansion; memoized so a command used in several variables runs once per process."""
+    return _shell_output(command).strip()
+
+
+_shell_command_locks : dict[str, threading.Lock] = {}
+_shell_command_locks_lock = threading.Lock()
+
+
+def _run_shell_once(command: str) -> str:
+    """Call _run_shell, making threads asking for the same command at the same time (e.g. imports loaded
+    concurrently) wait for the first one's result instead of running it again."""
+    with _shell_command_locks_lock:
+        lock = _shell_command_locks.setdefault(command, threading.Lock())
+    with lock:
+        return _run_shell(command)
+
+
+def _parse_yaml(path: str) -> Any:
+    with open(path, 'r') as file:
+        return yaml.load(file, Loader=YamlLoader)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_yaml(path: str, mtime_ns: int, size: int) -> Any:
+    """Parse a YAML file; memoized on its modification time and size so a file imported several times is parsed once,
+    and cached on disk so it isn't parsed again by the next runs."""
+    return load_cached(path, _parse_yaml)
+
+
+def _prefetch_commands(values: list[Any]):
+    """Run the `$(command)` expansions found in the values concurrently, filling the _run_shell cache.
+    Commands containing ${VAR} references are skipped, as their text is only known once resolved;
+    failures are ignored here and reported when the value is resolved."""
+    commands : set[str] = set()
+    stack = list(values)
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            commands.update(cmd for _, _, cmd in _find_commands(item) if '${' not in cmd)
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+    if len(commands) < 2:
+        return
+    Logger.debug(f'Running {len(commands)} commands concurrently...')
+    def run(command: str):
+        try:
+            _run_shell_once(command)
+        except sp.CalledProcessError:
+            pass
+    with ThreadPoolExecutor() as executor:
+        list(executor.map(run, commands))
 
 
 class Project:
-    def __init__(self, config_file : str, cl_variables: dict[str, str] = {}):
+    def __init__(self, config_file : str, cl_variables: dict[str, str] = {}, force_reload : bool = False):
+        """Load a project; with `force_reload`, its files (and the ones it imports) are parsed again even if cached."""
         self.config_file = os.path.abspath(config_file)
         
-        Logger.debug(f'Loading project configuration from: \033[33m{self.config_file}\033[0m')
+        Logger.debug(f'Loading project configuration from: {YELLOW}{self.config_file}{RESET}')
         
-        config = self.__load_config()
+        config = self.__load_config(force_reload)
         
         project_dir = os.path.dirname(self.config_file)
         
@@ -34,10 +208,13 @@ class Project:
         
         self.vars = {}
         self.imports : dict[str, Project] = {}
+        self._all_rules_cache : dict[str, Rule] | None = None # imports and rules are fixed once loaded
+        self._all_vars_cache : dict[str, Any] | None = None   # invalidated when variables are resolved
         
         imports_list = config.get('imports', [])
         
         Logger.debug(f'Loading {len(imports_list)} imports...')
+        sub_projects : list[tuple[dict[str, Any], str]] = []
         for imp in imports_list:
             path = imp['path']
             if not os.path.isabs(path):
@@ -49,11 +226,12 @@ class Project:
                 else:
                     raise ValueError(f'Import path is a directory but no build.yml found: {path}')
                 
-            Logger.debug(f'Loading file: \033[33m{path}\033[0m')
+            Logger.debug(f'Loading file: {YELLOW}{path}{RESET}')
             if is_project_file(path):
-                self.__load_config_file(imp, path)
+                self.__load_config_file(imp, path, force_reload)
             else:
-                self.__load_sub_project(imp, path, cl_variables)
+                sub_projects.append((imp, path))
+        self.__load_sub_projects(sub_projects, cl_variables, force_reload)
 
         self.vars.update(config.get('vars', {})) # variables from config file, can override pyproject.toml variables
         self.vars.update(variables) # builtin variables have priority over config file
@@ -65,11 +243,11 @@ class Project:
         rules = config.get('rules', {})
         self.rules : dict[str, Rule] = {}
         for name in rules:
-            Logger.debug(f'Loading rule: \033[33m{name}\033[0m')
+            Logger.debug(f'Loading rule: {YELLOW}{name}{RESET}')
             self.rules[name] = Rule(name, rules[name], self.get_all_vars(), self.files_groups)
             
-    def __load_config_file(self, imp: dict[str, str], path: str):
-        data = load_project_file(path)
+    def __load_config_file(self, imp: dict[str, str], path: str, force_reload: bool):
+        data = load_project_file(path, force_reload)
         as_name = imp.get('as', os.path.splitext(os.path.basename(path))[0]) # use filename without extension
         for key, value in flatten(data).items():
             key = f'{as_name}.{key}'
@@ -78,98 +256,267 @@ class Project:
             elif isinstance(value, (str, int, float, bool)):
                 value = str(value)
             else:
-                Logger.debug(f'Skipping used data key: \033[33m{key}\033[0m (type: {type(value).__name__})')
+                Logger.debug(f'Skipping used data key: {YELLOW}{key}{RESET} (type: {type(value).__name__})')
                 continue
                 
             self.vars[key] = value
-            Logger.debug(f'Stored used data key: \033[33m{key}\033[0m')
+            Logger.debug(f'Stored used data key: {YELLOW}{key}{RESET}')
     
-    def __load_sub_project(self, imp: dict[str, Any], path: str, cl_variables: dict[str, str]):
-        project = Project(path, cl_variables)
-        alias = imp.get('as', os.path.splitext(os.path.basename(path))[0])
-        self.imports[alias] = project
-        Logger.debug(f'Loaded import: \033[33m{path}\033[0m with alias: \033[33m{alias}\033[0m')
+    def __load_sub_projects(self, sub_projects: list[tuple[dict[str, Any], str]], cl_variables: dict[str, str], force_reload: bool):
+        """Load imported projects, on a thread pool when there are several (loading is dominated by
+        YAML parsing and $(command) expansions, which release the GIL). Imports keep their declaration order."""
+        if len(sub_projects) > 1:
+            with ThreadPoolExecutor() as executor:
+                projects = list(executor.map(lambda item: Project(item[1], cl_variables, force_reload), sub_projects))
+        else:
+            projects = [Project(path, cl_variables, force_reload) for _, path in sub_projects]
+        for (imp, path), project in zip(sub_projects, projects):
+            alias = imp.get('as', os.path.splitext(os.path.basename(path))[0])
+            self.imports[alias] = project
+            Logger.debug(f'Loaded import: {YELLOW}{path}{RESET} with alias: {YELLOW}{alias}{RESET}')
         
-    def __load_config(self):
+    def __load_config(self, force_reload: bool):
         """Load configuration from a YAML file."""
-        with open(self.config_file, 'r') as file:
-            config = yaml.safe_load(file)
-        return config
+        if force_reload:
+            return load_cached(self.config_file, _parse_yaml, force=True) # also refreshes the entry on disk
+        stat = os.stat(self.config_file)
+        return _load_yaml(self.config_file, stat.st_mtime_ns, stat.st_size)
     
-    def __resolve_variable_value(self, value: str) -> str:
+    def __resolve_variable_value(self, value: str, variables: dict[str, Any]) -> str:
         """Resolve nested items in variable value
-            - replace ${VAR} with the value of VAR
+            - replace ${VAR} with the value of VAR in `variables`
             - execute commands in $(command) and replace with output
         """
-        last_value = ""
-        while last_value != value:
-            last_value = value
+        substituted : list[str] = []
+        def substitute(match: re.Match) -> str:
+            key = match.group(1)
+            if key not in variables:
+                return match.group(0)
+            substituted.append(key)
+            return str(variables[key])
+        
+        seen : set[str] = set()
+        for _ in range(MAX_RESOLVE_ITER):
+            seen.add(value)
             # Substitute ${VAR}
-            for key, val in self.get_all_vars().items():
-                if not f'${{{key}}}' in value:
-                    continue
-                Logger.debug(f'Substituting \033[33m${{{key}}}\033[0m with \033[32m{val}\033[0m at:\n\033[30m{value}\033[0m')
-                value = value.replace(f'${{{key}}}', str(val))
-            # Expand $(command)
-            while '$(' in value:
-                start_idx = value.index('$(')
-                end_idx = value.index(')', start_idx)
-                command = value[start_idx + 2:end_idx]
-                Logger.debug(f'Running command: \033[33m{command}\033[0m')
+            value = VAR_RE.sub(substitute, value)
+            if substituted: # logged once per pass rather than once per reference
+                Logger.debug(f'Substituted {YELLOW}{", ".join(substituted)}{RESET}, giving:\n{GREY}{value}{RESET}')
+                substituted.clear()
+            # Expand $(command), in a single pass over the value
+            parts : list[str] = []
+            last_end = 0
+            for start, end, command in _find_commands(value):
+                Logger.debug(f'Running command: {YELLOW}{command}{RESET}')
                 try:
-                    result = sp.check_output(command, shell=True, text=True, stderr=sp.PIPE).strip()
-                    Logger.debug(f'Command output: \033[32m{result.strip()}\033[0m')
-                    value = value[:start_idx] + result + value[end_idx + 1:]
+                    result = _run_shell_once(command)
                 except sp.CalledProcessError as e:
                     Logger.error(f'{e}')
                     Logger.debug(e.stderr)
                     raise ValueError(f'Failed to execute command: {command}') from e
+                Logger.debug(f'Command output: {GREEN}{result}{RESET}')
+                parts += (value[last_end:start], result)
+                last_end = end
+            if parts:
+                value = ''.join(parts) + value[last_end:]
+            # another pass is only needed if the substituted text brought new references; stop once
+            # stable, or when circular references bring back a previous value
+            if '${' not in value or value in seen:
+                return value
+        Logger.warning(f'Variable references still unresolved after {MAX_RESOLVE_ITER} passes, giving up:\n{GREY}{value}{RESET}')
         return value
     
     def __resolve_all_variables(self):
         """Resolve all variables in self.vars."""
-        def resolve_item(item):
+        self._all_vars_cache = None
+        all_vars = self.get_all_vars() # built once, then kept in sync with the resolved values
+        # most values (e.g. the ones read from pyproject.toml) reference nothing and are left as they are
+        pending = {key for key, value in self.vars.items() if self.__has_references(value)}
+        _prefetch_commands([self.vars[key] for key in pending])
+        for key in self.__resolution_order(pending):
+            self.vars[key] = all_vars[key] = self.__resolve_item(self.vars[key], all_vars)
+    
+    def __resolve_item(self, item, variables: dict[str, Any]):
+        """Resolve the strings of a variable, walking nested dicts and lists with an explicit stack.
+        Containers are copied before being filled in, as they may be shared with the cached parsed config."""
+        if isinstance(item, str):
+            return self.__resolve_variable_value(item, variables)
+        if not isinstance(item, (dict, list)):
+            return item
+        root = dict(item) if isinstance(item, dict) else list(item)
+        stack : list[dict | list] = [root]
+        while stack:
+            container = stack.pop()
+            for k in (list(container) if isinstance(container, dict) else range(len(container))):
+                value = container[k]
+                if isinstance(value, str):
+                    container[k] = self.__resolve_variable_value(value, variables)
+                elif isinstance(value, (dict, list)):
+                    container[k] = dict(value) if isinstance(value, dict) else list(value)
+                    stack.append(container[k])
+        return root
+    
+    @staticmethod
+    def __has_references(item) -> bool:
+        """Check if a value contains ${VAR} references or $(command) expansions to resolve."""
+        if isinstance(item, str):
+            return '$' in item
+        elif isinstance(item, dict):
+            return any(Project.__has_references(v) for v in item.values())
+        elif isinstance(item, list):
+            return any(Project.__has_references(i) for i in item)
+        return False
+    
+    def __resolution_order(self, keys : set[str] | None = None) -> list[str]:
+        """Order the given local variables (all by default) so that each one comes after the ones it references,
+        letting most values resolve in a single pass. Cycles are broken arbitrarily."""
+        if keys is None:
+            keys = set(self.vars)
+        def references(item) -> set[str]:
             if isinstance(item, str):
-                return self.__resolve_variable_value(item)
+                return set(VAR_RE.findall(item))
             elif isinstance(item, dict):
-                return {k: resolve_item(v) for k, v in item.items()}
+                return set().union(*(references(v) for v in item.values()))
             elif isinstance(item, list):
-                return [resolve_item(i) for i in item]
-            else:
-                return item
+                return set().union(*(references(i) for i in item))
+            return set()
+        
+        dependencies = {key: references(self.vars[key]) & keys for key in keys}
+        order : list[str] = []
+        visited : set[str] = set()
+        def visit(key: str):
+            if key in visited:
+                return
+            visited.add(key)
+            for dependency in dependencies[key]:
+                visit(dependency)
+            order.append(key)
         for key in self.vars:
-            self.vars[key] = resolve_item(self.vars[key])
+            if key in keys:
+                visit(key)
+        return order
 
     def get_summary(self) -> str:
         """Get a summary of the project."""
-        summary = f"Project Configuration from: {self.config_file}\n"
-        summary += f"Variables:\n"
-        for k, v in self.vars.items():
-            summary += f"  {k}: {v}\n"
-        summary += f"Rules ({len(self.rules)}):\n"
-        for rule in self.rules.values():
-            summary += rule.get_summary() + "\n"
-        for imp in self.imports.values():
-            summary += imp.get_summary() + "\n"
-        return summary
+        lines : list[str] = []
+        for _, project in self.__walk_projects():
+            lines.append(f"Project Configuration from: {project.config_file}")
+            lines.append("Variables:")
+            lines.extend(f"  {k}: {v}" for k, v in project.vars.items())
+            lines.append(f"Rules ({len(project.rules)}):")
+            lines.extend(rule.get_summary() for rule in project.rules.values())
+        return '\n'.join(lines) + '\n'
     
     def select_rules(self, names_patterns : list[str], tags : list[str]) -> dict[str, Rule]:
         """Select rules by names or tags."""
         selected_rules : dict[str, Rule] = {}
+        compiled_patterns = [re.compile(pattern) for pattern in names_patterns]
         for name, rule in self.get_all_rules().items():
-            name_match = not names_patterns or any(re.fullmatch(pattern, name) for pattern in names_patterns)
+            name_match = not compiled_patterns or any(pattern.fullmatch(name) for pattern in compiled_patterns)
             tag_match = not tags or any(tag in rule.tags for tag in tags)
             if name_match and tag_match:
                 selected_rules[name] = rule
-                Logger.debug(f'Selected rule: \033[33m{name}\033[0m')
+                Logger.debug(f'Selected rule: {YELLOW}{name}{RESET}')
         return selected_rules
 
-    def run(self, rules : dict[str, Rule], force : bool = False):
-        """Run the specified rules."""
-        for name, rule in rules.items():
-            Logger.info(f'Running rule: \033[33m{name}\033[0m')
-            rule.execute(force)
+    def run(self, rules : dict[str, Rule], force : bool = False, jobs : int = 1):
+        """Run the specified rules, up to `jobs` at a time (0 for one per CPU).
+        A rule waits for the selected rules it depends on; rules sharing expected files never run together."""
+        glob_files.cache_clear() # files may have changed since the patterns were last expanded
+        graph = self.__dependency_graph(rules)
+        if jobs <= 0:
+            jobs = os.cpu_count() or 1
+        if jobs == 1:
+            for name in self.__topological_order(graph):
+                Logger.info(f'Running rule: {YELLOW}{name}{RESET}')
+                rules[name].execute(force)
+        else:
+            self.__run_parallel(rules, graph, force, jobs)
         Logger.info('All done.')
+    
+    def __dependency_graph(self, rules : dict[str, Rule]) -> dict[str, set[str]]:
+        """Map each rule to the selected rules it depends on: the ones listed in its `depends-on`,
+        named relatively to the project defining the rule, and the ones expecting files it requires.
+        Unselected rules are ignored. If the dependencies inferred from files make a cycle, they are
+        dropped, and only the `depends-on` ones are kept."""
+        all_rules = self.get_all_rules()
+        producers : dict[str, set[str]] = {} # several rules may expect the same file
+        for name, rule in rules.items():
+            for f in rule.expected_files:
+                producers.setdefault(os.path.abspath(f), set()).add(name)
+        explicit : dict[str, set[str]] = {}
+        graph : dict[str, set[str]] = {}
+        for name, rule in rules.items():
+            prefix = name[:len(name) - len(rule.name)] # import alias of the rule, e.g. 'sub.'
+            explicit[name] = set()
+            for dep in rule.depends_on:
+                dep_name = prefix + dep
+                if dep_name in rules:
+                    explicit[name].add(dep_name)
+                elif dep_name not in all_rules:
+                    Logger.warning(f'Rule {name} depends on unknown rule {dep_name}; ignoring.')
+            inferred = {p for f in rule.required_files for p in producers.get(os.path.abspath(f), ()) if p != name}
+            graph[name] = explicit[name] | inferred
+        try:
+            self.__topological_order(graph)
+        except ValueError:
+            self.__topological_order(explicit) # a cycle of depends-on entries is an error
+            Logger.warning('Rules depend on each other through the files they require and expect; '
+                           'ignoring these dependencies, and only following the depends-on fields.')
+            return explicit
+        return graph
+    
+    @staticmethod
+    def __topological_order(graph : dict[str, set[str]]) -> list[str]:
+        """Order rules so that each one comes after its dependencies, keeping the selection order otherwise."""
+        order : list[str] = []
+        done : set[str] = set()
+        pending = list(graph)
+        while pending:
+            name = next((n for n in pending if graph[n] <= done), None)
+            if name is None:
+                raise ValueError(f'Circular dependency between rules: {", ".join(pending)}')
+            pending.remove(name)
+            order.append(name)
+            done.add(name)
+        return order
+    
+    @staticmethod
+    def __run_parallel(rules : dict[str, Rule], graph : dict[str, set[str]], force : bool, jobs : int):
+        """Run rules on a thread pool, submitting each one as soon as its dependencies are done (Kahn's algorithm).
+        Once a rule fails, no new rule is started; the first error is raised after running rules finish."""
+        outputs = {name: set(rule.expected_files) for name, rule in rules.items()}
+        pending = list(graph)
+        done : set[str] = set()
+        running : dict[Future, str] = {}
+        error : BaseException | None = None
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            while pending or running:
+                if error is None:
+                    for name in list(pending):
+                        if len(running) >= jobs:
+                            break
+                        if not graph[name] <= done:
+                            continue
+                        if any(outputs[name] & outputs[other] for other in running.values()):
+                            continue # colliding rules write the same files, run them one after the other
+                        pending.remove(name)
+                        Logger.info(f'Running rule: {YELLOW}{name}{RESET}')
+                        running[executor.submit(rules[name].execute, force)] = name
+                if not running:
+                    if error is None:
+                        raise ValueError(f'Circular dependency between rules: {", ".join(pending)}')
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    exception = future.exception()
+                    if exception is None:
+                        done.add(name)
+                    elif error is None:
+                        error = exception
+        if error is not None:
+            raise error
 
     def get(self, name: str) -> Rule:
         """Get a rule or a variable by name. Support imported rules."""
@@ -225,25 +572,37 @@ class Project:
                 raise KeyError(f'Import not found: {import_alias}')
     
     
+    def __walk_projects(self):
+        """Yield this project and all its imports, depth first, with the prefix of their rules and variables."""
+        stack : list[tuple[str, Project]] = [('', self)]
+        while stack:
+            prefix, project = stack.pop()
+            yield prefix, project
+            # pushed in reverse so imports are visited in declaration order
+            stack.extend((prefix + alias + '.', imp) for alias, imp in reversed(project.imports.items()))
+    
     def get_all_vars(self) -> dict[str, str]:
-        """Get all project variables, including imported ones."""
-        all_vars = dict(self.vars)  # Start with local vars
-        if not self.imports: # fail-fast
-            return all_vars
-        Logger.trace(f"Imports found: {list(self.imports.keys())}")
-        for alias, import_obj in self.imports.items():
-            imported_vars = import_obj.get_all_vars()
-            imported_vars = {f'{alias}.{k}': v for k, v in imported_vars.items()}
-            all_vars.update(imported_vars)
+        """Get all project variables, including imported ones. The result is computed once and shared; don't mutate it."""
+        if self._all_vars_cache is not None:
+            return self._all_vars_cache
+        if self.imports:
+            Logger.trace(f"Imports found: {list(self.imports.keys())}")
+        all_vars = {}
+        for prefix, project in self.__walk_projects():
+            for k, v in project.vars.items():
+                all_vars[prefix + k] = v
+        self._all_vars_cache = all_vars
         return all_vars
     
     def get_all_rules(self) -> dict[str, Rule]:
-        """Get all project rules, including imported ones."""
-        all_rules = dict(self.rules)  # Start with local rules
-        for alias, import_obj in self.imports.items():
-            imported_rules = import_obj.get_all_rules()
-            imported_rules = {f'{alias}.{k}': v for k, v in imported_rules.items()}
-            all_rules.update(imported_rules)
+        """Get all project rules, including imported ones. The result is computed once and shared; don't mutate it."""
+        if self._all_rules_cache is not None:
+            return self._all_rules_cache
+        all_rules = {}
+        for prefix, project in self.__walk_projects():
+            for k, v in project.rules.items():
+                all_rules[prefix + k] = v
+        self._all_rules_cache = all_rules
         return all_rules
 
     
\ No newline at end of file
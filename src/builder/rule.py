@@ -1,10 +1,14 @@
 import os
+import stat
+import json
+import hashlib
 from datetime import datetime
+from functools import cached_property
 from typing import Any
 
 from gamuLogger import Logger
 
-from .utils import get_max_edit_time, files_exists, apply_variables, expand_files
+from .utils import stat_many, any_newer, apply_variables, expand_files, GREY, RESET
 from .command import Command, CommandExecutionError
 
 
@@ -14,21 +18,18 @@ class Rule:
         
         self.tags : list[str] = config.get('tags', [])
         
-        Logger.debug(f"Initializing rule: {name}")
+        depends_on = config.get('depends-on', [])
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        self.depends_on : list[str] = depends_on
         
-        required_files = config.get('required-files', [])
-        if isinstance(required_files, str):
-            required_files = files_groups.get(required_files, [])
-        Logger.debug(f"Expanding required-files for rule {name}...")
-        required_files = [apply_variables(item, variables) for item in required_files]
-        self.required_files = expand_files(required_files)
+        Logger.debug(f"Initializing rule: {name}")
         
-        expected_files = config.get('expected-files', [])
-        if isinstance(expected_files, str):
-            expected_files = files_groups.get(expected_files, [])
-        Logger.debug(f"Expanding expected-files for rule {name}...")
-        expected_files = [apply_variables(item, variables) for item in expected_files]
-        self.expected_files = expand_files(expected_files)
+        # file lists and commands are only resolved when first needed, so listing or
+        # selecting rules doesn't pay for globbing every rule of the project
+        self.__config = config
+        self.__variables = variables
+        self.__files_groups = files_groups
         
         working_dir = config.get('working-directory', None)
         if working_dir:
@@ -38,9 +39,32 @@ class Rule:
         else:
             self.working_directory = variables['PROJECT_DIR']
         
-        commands = config.get('commands', [])
-        Logger.debug(f"Processing commands for rule {name}...")
-        self.commands = [apply_variables(cmd, variables) for cmd in commands]        
+        self.cache_dir = os.path.join(variables.get('PROJECT_DIR', self.working_directory), '.builder-cache')
+    
+    
+    def __expand_config_files(self, key : str) -> list[str]:
+        """Expand the files (or files group) listed under `key` in the rule's config."""
+        files = self.__config.get(key, [])
+        if isinstance(files, str):
+            files = self.__files_groups.get(files, [])
+        Logger.debug(f"Expanding {key} for rule {self.name}...")
+        return expand_files([apply_variables(item, self.__variables) for item in files])
+    
+    
+    @cached_property
+    def required_files(self) -> list[str]:
+        return self.__expand_config_files('required-files')
+    
+    
+    @cached_property
+    def expected_files(self) -> list[str]:
+        return self.__expand_config_files('expected-files')
+    
+    
+    @cached_property
+    def commands(self) -> list[str]:
+        Logger.debug(f"Processing commands for rule {self.name}...")
+        return [apply_variables(cmd, self.__variables) for cmd in self.__config.get('commands', [])]
     
     
     def __repr__(self) -> str:
@@ -49,43 +73,40 @@ class Rule:
 
     def get_summary(self) -> str:
         """Get a summary of the rule."""
-        summary = f"Rule: {self.name}\n"
-        summary += f"  Tags: {', '.join(self.tags)}\n"
-        summary += f"  Required Files ({len(self.required_files)}):\n"
-        for f in self.required_files:
-            summary += f"    - {f}\n"
-        summary += f"  Expected Files ({len(self.expected_files)}):\n"
-        for f in self.expected_files:
-            summary += f"    - {f}\n"
-        summary += f"  Working Directory: {self.working_directory}\n"
-        summary += f"  Commands ({len(self.commands)}):\n"
-        for cmd in self.commands:
-            summary += f"    - {cmd}\n"
-        return summary
+        lines = [
+            f"Rule: {self.name}",
+            f"  Tags: {', '.join(self.tags)}",
+            f"  Depends On: {', '.join(self.depends_on)}",
+            f"  Required Files ({len(self.required_files)}):",
+            *(f"    - {f}" for f in self.required_files),
+            f"  Expected Files ({len(self.expected_files)}):",
+            *(f"    - {f}" for f in self.expected_files),
+            f"  Working Directory: {self.working_directory}",
+            f"  Commands ({len(self.commands)}):",
+            *(f"    - {cmd}" for cmd in self.commands),
+        ]
+        return '\n'.join(lines) + '\n'
 
-    def __execute_commands(self):
-        """Execute the commands defined in the rule."""
+    def __execute_commands(self) -> bool:
+        """Execute the commands defined in the rule. Return False if any of them failed."""
 
         Logger.info(f'Executing commands for rule {self.name}...')
-        original_wd = os.getcwd()
-        os.chdir(self.working_directory)
-        Logger.debug(f'Changed working directory to: {self.working_directory}')
+        Logger.debug(f'Working directory: {self.working_directory}')
         
         commands = [Command(cmd) for cmd in self.commands]
         
         error_flag = False
         for cmd in commands:
             if error_flag and not cmd.metadata.always_run:
-                Logger.info(f'Skipping command due to previous error: \033[30m{cmd.command}\033[0m')
+                Logger.info(f'Skipping command due to previous error: {GREY}{cmd.command}{RESET}')
                 continue
             try:
-                cmd.execute()
+                # the working directory is given to the child process rather than set with os.chdir,
+                # so rules running in parallel threads don't race on the process-wide cwd
+                cmd.execute(self.working_directory)
             except CommandExecutionError as e:
                 error_flag = True
-            
-            
-        os.chdir(original_wd)
-        Logger.debug(f'Restored working directory to: {original_wd}')
+        return not error_flag
 
 
     def __check_required_files(self) -> bool:
@@ -110,28 +131,69 @@ class Rule:
         return True
 
 
-    def __get_last_edited_time_required(self) -> float:
-        """Get the last edited time among required files."""
-        return get_max_edit_time(self.required_files)
-
-
-    def __get_last_edited_time_expected(self) -> float:
-        """Get the last edited time among expected files."""
-        return get_max_edit_time(self.expected_files)
-    
-    
     def __must_be_rerun(self) -> bool:
         """Determine if the rule must be re-executed based on file modification times."""
-        if (not self.expected_files # the rule has no expected files, so we cannot check if it is up to date
-        or not files_exists(self.expected_files)): # some expected files are missing
+        if not self.expected_files: # the rule has no expected files, so we cannot check if it is up to date
             return True
-        last_required = self.__get_last_edited_time_required()
-        last_expected = self.__get_last_edited_time_expected()
-        dt_required = datetime.fromtimestamp(last_required)
-        dt_expected = datetime.fromtimestamp(last_expected)
-        Logger.debug(f'Last required file edit time: {dt_required.isoformat()}')
-        Logger.debug(f'Last expected file edit time: {dt_expected.isoformat()}')
-        return last_required > last_expected
+        expected_stats = stat_many(self.expected_files) # one stat per file for both the existence and the times
+        if any(st is None for st in expected_stats.values()): # some expected files are missing
+            return True
+        last_expected = max(st.st_mtime for st in expected_stats.values())
+        Logger.debug(f'Last expected file edit time: {datetime.fromtimestamp(last_expected).isoformat()}')
+        # same as comparing the last edit times of both sides, but stops at the first newer required file
+        return any_newer(self.required_files, last_expected)
+    
+    
+    def __cache_key(self) -> str:
+        """Compute a key from the rule's commands, its expected files and the content of its required files."""
+        digest = hashlib.blake2b()
+        for item in (self.working_directory, *self.commands, *self.expected_files):
+            digest.update(item.encode() + b'\0')
+        for f, st in sorted(stat_many(self.required_files).items()):
+            digest.update(f.encode() + b'\0')
+            if st is None:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                try:
+                    with open(f, 'rb') as file:
+                        while block := file.read(65536):
+                            digest.update(block)
+                except OSError: # removed since it was stat'ed, the key just won't match a previous run
+                    pass
+            else:
+                digest.update(str(st.st_mtime).encode())
+        return digest.hexdigest()
+    
+    
+    def __is_cached(self, key: str) -> bool:
+        """Check if the rule already succeeded with this key and its expected files are unchanged since."""
+        try:
+            with open(os.path.join(self.cache_dir, f'{key}.json'), 'r') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return False
+        for path, mtime, size in entry.get('outputs', []):
+            try:
+                st = os.stat(path)
+            except OSError:
+                return False
+            if st.st_mtime != mtime or st.st_size != size:
+                return False
+        return True
+    
+    
+    def __store_cache_entry(self, key: str):
+        """Record the expected files produced by a successful execution."""
+        try:
+            outputs = []
+            for f in self.expected_files:
+                st = os.stat(f)
+                outputs.append([f, st.st_mtime, st.st_size])
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(os.path.join(self.cache_dir, f'{key}.json'), 'w') as file:
+                json.dump({'rule': self.name, 'outputs': outputs}, file)
+        except OSError as e:
+            Logger.debug(f'Could not write cache entry for rule {self.name}: {e}')
     
     
     def execute(self, force: bool = False):
@@ -143,8 +205,16 @@ class Rule:
             Logger.info(f'Rule {self.name} is up to date; skipping execution.')
             return
         
-        self.__execute_commands()
+        # rules without expected files can't be checked afterwards, so they are never cached
+        cache_key = self.__cache_key() if self.expected_files else None
+        if not force and cache_key is not None and self.__is_cached(cache_key):
+            Logger.info(f'Rule {self.name}: cache hit; skipping execution.')
+            return
+        
+        success = self.__execute_commands()
         
         if not self.__check_expected_files():
             raise RuntimeError(f'Rule {self.name} execution failed: expected files not found.')
+        if success and cache_key is not None:
+            self.__store_cache_entry(cache_key)
         Logger.info(f'Rule {self.name} executed successfully.')
\ No newline at end of file
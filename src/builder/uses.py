@@ -1,20 +1,26 @@
+import os
 import tomllib
 import json
 from typing import Any, Callable
 
+from .utils import load_cached
 
-FilesLoaders : dict[str, Callable[[str], dict[str, Any]]] = {
-    'pyproject.toml': lambda path: __load_pyproject_toml(path),
-    'package.json': lambda path: __load_package_json(path),
+
+FilesLoaders : dict[str, Callable[[str, bool], dict[str, Any]]] = { # called with the path and the force flag
+    'pyproject.toml': lambda path, force: __load_pyproject_toml(path, force),
+    'package.json': lambda path, force: __load_package_json(path),
 }
 
 
-def __load_pyproject_toml(filepath) -> dict[str, Any]:
-    """Load and parse pyproject.toml file."""
+def __parse_toml(filepath) -> dict[str, Any]:
     with open(filepath, 'rb') as f:
-        pyproject_data = tomllib.load(f)
-        if not "project" in pyproject_data:
-            raise ValueError("pyproject.toml does not contain a [project] section.")
+        return tomllib.load(f)
+
+def __load_pyproject_toml(filepath, force: bool = False) -> dict[str, Any]:
+    """Load and parse pyproject.toml file; with `force`, the cached parsed file is ignored."""
+    pyproject_data = load_cached(filepath, __parse_toml, force)
+    if not "project" in pyproject_data:
+        raise ValueError("pyproject.toml does not contain a [project] section.")
     return pyproject_data["project"]
 
 def __load_package_json(filepath) -> dict[str, Any]:
@@ -23,13 +29,13 @@ def __load_package_json(filepath) -> dict[str, Any]:
         package_data = json.load(f)
     return package_data
 
-def load_project_file(filepath: str) -> dict[str, Any]:
-    """Determine file type and load accordingly."""
-    for filename, loader in FilesLoaders.items():
-        if filepath.endswith(filename):
-            return loader(filepath)
-    raise ValueError(f"Unsupported file type for: {filepath}")
+def load_project_file(filepath: str, force: bool = False) -> dict[str, Any]:
+    """Determine file type and load accordingly; with `force`, the file is parsed again even if it is cached."""
+    loader = FilesLoaders.get(os.path.basename(filepath))
+    if loader is None:
+        raise ValueError(f"Unsupported file type for: {filepath}")
+    return loader(filepath, force)
 
 def is_project_file(filepath: str) -> bool:
     """Check if the given file is a supported project file."""
-    return any(filepath.endswith(filename) for filename in FilesLoaders.keys())
\ No newline at end of file
+    return os.path.basename(filepath) in FilesLoaders
\ No newline at end of file
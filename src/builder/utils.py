@@ -1,11 +1,47 @@
 import os
+import re
+import sys
 import glob
-from typing import Iterable, Any
+import pickle
+import hashlib
+import tempfile
+import functools
+from typing import Iterable, Any, Callable
 from gamuLogger import Logger
 
+VAR_RE = re.compile(r'\$\{([^}]+)\}') # ${VAR} references
+
+def _colors(isatty: bool) -> tuple[str, str, str, str, str]:
+    """Return the ANSI codes for grey, red, green, yellow and reset; empty when the output is not a terminal (pipes, CI logs)."""
+    if not isatty:
+        return ('', '', '', '', '')
+    return ('\033[30m', '\033[31m', '\033[32m', '\033[33m', '\033[0m')
+
+GREY, RED, GREEN, YELLOW, RESET = _colors(sys.stdout.isatty())
+
+def stat_many(files: Iterable[str]) -> dict[str, os.stat_result | None]:
+    """Stat each file once; files that can't be stat'ed (e.g. missing) map to None."""
+    stats : dict[str, os.stat_result | None] = {}
+    for f in files:
+        try:
+            stats[f] = os.stat(f)
+        except OSError:
+            stats[f] = None
+    return stats
+
 def get_max_edit_time(files: Iterable[str]) -> float:
     """Get the last edited time among an iterable of files."""
-    return max((os.path.getmtime(f) for f in files if os.path.exists(f)), default=0.0)
+    return max((stat.st_mtime for stat in stat_many(files).values() if stat is not None), default=0.0)
+
+def any_newer(files: Iterable[str], threshold: float) -> bool:
+    """Check if any of the files was edited after `threshold`, stopping at the first one found."""
+    for f in files:
+        try:
+            if os.stat(f).st_mtime > threshold:
+                return True
+        except OSError:
+            pass
+    return False
 
 def files_exists(files: Iterable[str]) -> bool:
     """Check if all files in the iterable exist."""
@@ -16,18 +52,33 @@ def is_pattern(s : str) -> bool:
     return '*' in s or '?' in s or '[' in s
 
 def apply_variables(value: str, variables: dict[str, Any]) -> str:
-        """Apply variable substitution in a string."""
-        for var, var_value in variables.items():
-            Logger.trace(f"Substituting variable: {var} with value: {var_value}")
-            value = value.replace(f"${{{var}}}", str(var_value))
-        return value    
+        """Apply variable substitution in a string, in a single pass over it. Unknown references are kept."""
+        if '${' not in value: # most files and commands have no reference at all
+            return value
+        substituted : list[str] = []
+        def substitute(match: re.Match) -> str:
+            var = match.group(1)
+            if var not in variables:
+                return match.group(0)
+            substituted.append(var)
+            return str(variables[var])
+        result = VAR_RE.sub(substitute, value)
+        if substituted: # logged once per value rather than once per reference
+            Logger.trace(f"Substituted variables {', '.join(substituted)} in: {value}")
+        return result
+
+@functools.lru_cache(maxsize=None)
+def glob_files(pattern: str) -> tuple[str, ...]:
+    """Glob a pattern; memoized so rules sharing a pattern walk the filesystem once.
+    Call `glob_files.cache_clear()` when files may have been created or removed."""
+    return tuple(glob.glob(pattern, recursive=True))
 
 def expand_files(items: list[str]) -> list[str]:
         """Expand file patterns into actual file paths."""
         expanded_files = []
         for item in items:
             if is_pattern(item):
-                matched_files = glob.glob(item, recursive=True)
+                matched_files = glob_files(item)
                 expanded_files.extend(matched_files)
                 Logger.debug(f"Expanding pattern: {item} expanded to {len(matched_files)} files.")
                 Logger.trace(matched_files)
@@ -40,14 +91,51 @@ def expand_files(items: list[str]) -> list[str]:
 def flatten(dic: dict[str, Any], parent_key: str = '', sep: str = '.') -> dict[str, Any]:
     """Flatten a nested dictionary."""
     items = {}
-    for k, v in dic.items():
-        new_key = f"{parent_key}{sep}{k}" if parent_key else k
-        if isinstance(v, dict):
-            items.update(flatten(v, new_key, sep=sep))
-        else:
+    # one iterator per nesting level, so keys keep their order without building a dict per level
+    stack = [(parent_key, iter(dic.items()))]
+    while stack:
+        prefix, entries = stack[-1]
+        for k, v in entries:
+            new_key = f"{prefix}{sep}{k}" if prefix else k
+            if isinstance(v, dict):
+                stack.append((new_key, iter(v.items())))
+                break
             items[new_key] = v
+        else:
+            stack.pop()
     return items
 
 def list2str(lst: list[Any]) -> str:
     """Convert a list to a comma-separated string (parseable by bash)."""
-    return ', '.join(str(item) for item in lst)
\ No newline at end of file
+    return ', '.join(str(item) for item in lst)
+
+def user_cache_dir() -> str:
+    """Get the directory where builder keeps its cache across runs."""
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'builder')
+
+def load_cached(path: str, parse: Callable[[str], Any], force: bool = False) -> Any:
+    """Parse a file with `parse`, keeping the result in the user's cache directory;
+    it is only parsed again once the file's modification time or size changes, or if `force` is true."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size, f'{parse.__module__}.{parse.__qualname__}')
+    cache_file = os.path.join(user_cache_dir(), 'parsed', hashlib.blake2b(path.encode(), digest_size=16).hexdigest() + '.pkl')
+    if not force:
+        try:
+            with open(cache_file, 'rb') as file:
+                cached_stamp, data = pickle.load(file)
+            if cached_stamp == stamp:
+                Logger.trace(f"Loaded {path} from cache")
+                return data
+        except Exception: # unpickling a damaged or foreign entry can raise almost anything, so just parse again
+            pass
+    data = parse(path)
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(cache_file))
+        with os.fdopen(fd, 'wb') as file:
+            pickle.dump((stamp, data), file)
+        os.replace(tmp_file, cache_file) # atomic, so concurrent runs never read a partial entry
+    except OSError as e:
+        Logger.debug(f"Could not cache {path}: {e}")
+    return data
@@ -0,0 +1,159 @@
+import hashlib
+import shutil
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def user_cache_dir(tmp_path_factory, monkeypatch):
+    """Keep the cache of parsed files out of the user's home directory."""
+    cache_home = tmp_path_factory.mktemp('cache')
+    monkeypatch.setenv('XDG_CACHE_HOME', str(cache_home))
+    return cache_home / 'builder'
+
+
+class _NullLogger:
+    """Stands in for gamuLogger's Logger: every logging method accepts anything and does nothing."""
+    
+    @staticmethod
+    def _discard(*args, **kwargs):
+        pass
+    
+    def __getattr__(self, name):
+        return self._discard
+
+
+@pytest.fixture(scope='session', autouse=True)
+def null_command_logger():
+    """Silence builder.command's logging for the whole session; tests asserting on log calls patch Logger themselves."""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr('builder.command.Logger', _NullLogger())
+        yield
+
+
+# The project configurations below are only read by the tests, so each is written once per session
+# (through config_writer, unless its imports need a directory layout); a test that needs to modify one
+# works on a copy.
+
+BASIC_CONFIG = """\
+vars:
+  BUILD_DIR: build
+  SOURCE_DIR: src
+rules:
+  compile:
+    tags: [build]
+    required-files: [src/main.py]
+    expected-files: [build/output.txt]
+    commands: ['echo "compiling"']
+  test:
+    tags: [test]
+    required-files: [tests/test_*.py]
+    expected-files: []
+    commands: [pytest]
+"""
+
+VARIABLES_CONFIG = """\
+vars:
+  BASE: /path/to
+  NESTED: ${BASE}/nested
+rules:
+  build:
+    tags: [build]
+    required-files: ['${BASE}/input.txt']
+    expected-files: ['${NESTED}/output.txt']
+    commands: ['echo "${NESTED}"']
+"""
+
+FILE_GROUPS_CONFIG = """\
+files-groups:
+  source_files: [src/main.py, src/utils.py]
+  test_files: [tests/test_*.py]
+rules:
+  build:
+    tags: [build]
+    required-files: source_files
+    expected-files: [build/app]
+    commands: ['python -m py_compile ${BUILD_DIR}']
+vars:
+  BUILD_DIR: build
+"""
+
+
+@pytest.fixture(scope='session')
+def config_writer(tmp_path_factory):
+    """Return a function writing a configuration to a file and returning its path; identical configurations share one file."""
+    configs_dir = tmp_path_factory.mktemp('configs')
+    paths : dict[str, str] = {}
+    
+    def write(text : str) -> str:
+        key = hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+        if key not in paths:
+            path = configs_dir / f'{key}.yml'
+            path.write_text(text)
+            paths[key] = str(path)
+        return paths[key]
+    return write
+
+
+@pytest.fixture(scope='session')
+def basic_config(config_writer):
+    """Create a basic build.yml configuration file."""
+    return config_writer(BASIC_CONFIG)
+
+
+@pytest.fixture(scope='session')
+def config_with_imports(tmp_path_factory):
+    """Create a config file with imports."""
+    temp_dir = tmp_path_factory.mktemp('imports')
+    # Create sub-project
+    (temp_dir / 'subproject').mkdir()
+    (temp_dir / 'subproject' / 'build.yml').write_text("""\
+vars:
+  SUB_VAR: sub_value
+rules:
+  sub_rule:
+    tags: [sub]
+    required-files: []
+    expected-files: []
+    commands: ['echo "sub"']
+""")
+    
+    # Create main config
+    config_file = temp_dir / 'build.yml'
+    config_file.write_text("""\
+imports:
+  - path: subproject/build.yml
+    as: sub
+vars:
+  MAIN_VAR: main_value
+rules: {}
+""")
+    return str(config_file)
+
+
+@pytest.fixture(scope='session')
+def config_with_variables(config_writer):
+    """Create a config with variable substitution."""
+    return config_writer(VARIABLES_CONFIG)
+
+
+@pytest.fixture(scope='session')
+def config_with_file_groups(config_writer):
+    """Create a config with file groups."""
+    return config_writer(FILE_GROUPS_CONFIG)
+
+
+@pytest.fixture(scope='session')
+def project_template(tmp_path_factory):
+    """Create a project directory with a sub-project and a pyproject.toml, but no build.yml of its own."""
+    template = tmp_path_factory.mktemp('template')
+    (template / 'subproject').mkdir()
+    (template / 'subproject' / 'build.yml').write_text("vars:\n  SUB_VAR: sub_value\nrules: {}\n")
+    (template / 'pyproject.toml').write_text('[project]\nname = "test_project"\nversion = "1.0.0"\n')
+    return template
+
+
+@pytest.fixture
+def project_dir(tmp_path, project_template):
+    """Copy project_template to a directory of the test's own, where it writes the build.yml importing from it."""
+    return str(shutil.copytree(project_template, tmp_path / 'project'))
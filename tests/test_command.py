@@ -1,56 +1,83 @@
 # type: ignore[reportAttributeAccessIssue]
 import pytest
+from functools import lru_cache
 from unittest.mock import MagicMock, patch, Mock
+import os
+import shlex
 import subprocess as sp
+import threading
 
-from builder.command import Command, CommandExecutionError, CommandMetaData
+from builder.command import Command, CommandExecutionError, CommandMetaData, run_command, _split_command
 
 
+@lru_cache(maxsize=None)
+def _parse(raw: str) -> Command:
+    """Parse a command once for the tests that only read it or execute it with run_command stubbed
+    (execute doesn't modify the command). Tests asserting on what parsing logs must build a fresh Command."""
+    return Command(raw)
+
+
+_stub_run = Mock()
+_stub_logger = Mock()
+
+
+@pytest.fixture
+def stub_cmd_env(monkeypatch):
+    """Install the run_command and Logger stubs in builder.command, resetting them after the test.
+    Used by every test of TestCommandExecute; request it by name to get the (run_command, Logger) stubs."""
+    monkeypatch.setattr('builder.command.run_command', _stub_run)
+    monkeypatch.setattr('builder.command.Logger', _stub_logger)
+    yield _stub_run, _stub_logger
+    _stub_run.reset_mock(return_value=True, side_effect=True)
+    _stub_logger.reset_mock(return_value=True, side_effect=True)
+
+
+@pytest.mark.usefixtures('stub_cmd_env')
 class TestCommandExecute:
     """Tests for Command.execute() method."""
 
-    @patch('builder.command.run_command')
-    def test_execute_success_non_silent(self, mock_run_command):
-        """Test successful command execution in non-silent mode."""
-        mock_run_command.return_value = None
-        
-        cmd = Command('echo "test"')
-        cmd.execute()
-        
-        mock_run_command.assert_called_once_with('echo "test"', True)
+    @pytest.mark.parametrize('raw,expected_cmd,log', [
+        ('echo "test"', 'echo "test"', True),
+        ('+silent echo "test"', 'echo "test"', False),
+        ('+always ls -la', 'ls -la', True),
+        ('+always +silent echo "test"', 'echo "test"', False),
+        ('python script.py --arg value', 'python script.py --arg value', True),
+        ('cat file.txt | grep pattern', 'cat file.txt | grep pattern', True),
+        ('echo "test" > output.txt', 'echo "test" > output.txt', True),
+        ('+always  +silent   ', '', False),
+    ])
+    def test_execute_passes_command(self, stub_cmd_env, raw, expected_cmd, log):
+        """Test that the command, stripped of its macros, is run with logging unless silent."""
+        mock_run_command, _ = stub_cmd_env
+        
+        _parse(raw).execute()
+        
+        mock_run_command.assert_called_once_with(expected_cmd, log, None)
 
-    @patch('builder.command.run_command')
-    def test_execute_success_silent_mode(self, mock_run_command):
-        """Test successful command execution in silent mode."""
-        mock_run_command.return_value = None
-        
-        cmd = Command('+silent echo "test"')
-        assert cmd.metadata.silent is True
-        cmd.execute()
-        
-        # log parameter should be False (not silent = False)
-        mock_run_command.assert_called_once_with('echo "test"', False)
-
-    @patch('builder.command.Logger')
-    @patch('builder.command.run_command')
-    def test_execute_failure_raises_error(self, mock_run_command, mock_logger):
-        """Test that failed command raises CommandExecutionError."""
-        error = sp.CalledProcessError(1, 'false', stderr='Command failed')
-        mock_run_command.side_effect = error
+    @pytest.mark.parametrize('raw,returncode,stderr', [
+        ('false', 1, ''),
+        ('+silent nonexistent_command', 127, 'command not found'),
+        ('cmd', 42, 'error'),
+    ])
+    def test_execute_failure_raises_error(self, stub_cmd_env, raw, returncode, stderr):
+        """Test that a CalledProcessError is wrapped in CommandExecutionError."""
+        mock_run_command, _ = stub_cmd_env
+        original_error = sp.CalledProcessError(returncode, 'cmd', stderr=stderr)
+        mock_run_command.side_effect = original_error
         
-        cmd = Command('false')
+        with pytest.raises(CommandExecutionError) as exc_info:
+            _parse(raw).execute()
         
-        with pytest.raises(CommandExecutionError):
-            cmd.execute()
+        assert exc_info.value.__cause__ is original_error
 
-    @patch('builder.command.Logger')
-    @patch('builder.command.run_command')
-    def test_execute_failure_non_silent_logs_generic_error(self, mock_run_command, mock_logger):
+    def test_execute_failure_non_silent_logs_generic_error(self, stub_cmd_env):
         """Test that non-silent mode logs generic error on failure."""
+        mock_run_command, mock_logger = stub_cmd_env
+        
         error = sp.CalledProcessError(1, 'cmd', stderr='some error output')
         mock_run_command.side_effect = error
         
-        cmd = Command('failing_cmd')
+        cmd = _parse('failing_cmd')
         assert cmd.metadata.silent is False
         
         with pytest.raises(CommandExecutionError):
@@ -61,14 +88,14 @@ class TestCommandExecute:
         error_msg = mock_logger.error.call_args[0][0]
         assert '1' in error_msg
 
-    @patch('builder.command.Logger')
-    @patch('builder.command.run_command')
-    def test_execute_failure_silent_logs_stderr(self, mock_run_command, mock_logger):
+    def test_execute_failure_silent_logs_stderr(self, stub_cmd_env):
         """Test that silent mode logs stderr on failure."""
+        mock_run_command, mock_logger = stub_cmd_env
+        
         error = sp.CalledProcessError(2, 'cmd', stderr='detailed error output')
         mock_run_command.side_effect = error
         
-        cmd = Command('+silent failing_cmd')
+        cmd = _parse('+silent failing_cmd')
         assert cmd.metadata.silent is True
         
         with pytest.raises(CommandExecutionError):
@@ -80,154 +107,252 @@ class TestCommandExecute:
         assert '2' in error_msg
         assert 'detailed error output' in error_msg
 
-    @patch('builder.command.run_command')
-    def test_execute_with_always_run_macro(self, mock_run_command):
-        """Test execution with @always-run macro."""
-        mock_run_command.return_value = None
+    def test_execute_logs_debug_message(self, stub_cmd_env):
+        """Test that debug message is logged before execution."""
+        mock_run_command, mock_logger = stub_cmd_env
         
-        cmd = Command('+always ls -la')
-        assert cmd.metadata.always_run is True
-        assert cmd.command == 'ls -la'
+        cmd = _parse('test_command')
         cmd.execute()
         
-        mock_run_command.assert_called_once_with('ls -la', True)
+        # Should log debug message with the command
+        mock_logger.debug.assert_called_once()
+        debug_msg = mock_logger.debug.call_args[0][0]
+        assert 'test_command' in debug_msg
 
-    @patch('builder.command.run_command')
-    def test_execute_with_both_macros(self, mock_run_command):
-        """Test execution with both @always-run and @silent macros."""
-        mock_run_command.return_value = None
+    def test_execute_preserves_command_string(self):
+        """Test that execute doesn't modify the command attribute."""
+        original_cmd = 'echo "preserve me"'
+        cmd = _parse(original_cmd)
+        original_value = cmd.command
         
-        cmd = Command('+always +silent echo "test"')
-        assert cmd.metadata.always_run is True
-        assert cmd.metadata.silent is True
-        assert cmd.command == 'echo "test"'
         cmd.execute()
         
-        # Verify log=False is passed for silent mode
-        mock_run_command.assert_called_once_with('echo "test"', False)
+        # Command should remain unchanged
+        assert cmd.command == original_value
 
-    @patch('builder.command.run_command')
-    def test_execute_command_string_passed_correctly(self, mock_run_command):
-        """Test that the correct command string is passed to run_command."""
-        mock_run_command.return_value = None
+    def test_execute_multiple_times(self, stub_cmd_env):
+        """Test that command can be executed multiple times."""
+        mock_run_command, _ = stub_cmd_env
         
-        test_cmd = 'python script.py --arg value'
-        cmd = Command(test_cmd)
+        cmd = Command('echo test')
         cmd.execute()
-        
-        # First argument should be the command
-        called_cmd = mock_run_command.call_args[0][0]
-        assert called_cmd == test_cmd
-
-    @patch('builder.command.run_command')
-    def test_execute_command_with_pipes(self, mock_run_command):
-        """Test execution of command with pipes."""
-        mock_run_command.return_value = None
-        
-        cmd = Command('cat file.txt | grep pattern')
         cmd.execute()
-        
-        mock_run_command.assert_called_once()
-        assert mock_run_command.call_args[0][0] == 'cat file.txt | grep pattern'
-
-    @patch('builder.command.run_command')
-    def test_execute_command_with_redirects(self, mock_run_command):
-        """Test execution of command with output redirection."""
-        mock_run_command.return_value = None
-        
-        cmd = Command('echo "test" > output.txt')
         cmd.execute()
         
-        mock_run_command.assert_called_once()
-        assert mock_run_command.call_args[0][0] == 'echo "test" > output.txt'
+        # Should be called 3 times
+        assert mock_run_command.call_count == 3
+
+
+class TestCommandParsing:
+    """Tests for macro parsing in Command.__init__."""
+
+    def test_macros_are_case_insensitive(self):
+        """Test that macros are recognized regardless of case."""
+        cmd = _parse('+ALWAYS +Silent make all')
+        assert cmd.metadata.always_run is True
+        assert cmd.metadata.silent is True
+        assert cmd.command == 'make all'
+
+    def test_macro_after_command_is_kept(self):
+        """Test that only leading tokens are parsed as macros."""
+        cmd = _parse('echo +silent')
+        assert cmd.metadata.silent is False
+        assert cmd.command == 'echo +silent'
 
     @patch('builder.command.Logger')
-    @patch('builder.command.run_command')
-    def test_execute_logs_debug_message(self, mock_run_command, mock_logger):
-        """Test that debug message is logged before execution."""
-        mock_run_command.return_value = None
-        
-        cmd = Command('test_command')
-        cmd.execute()
-        
-        # Should log debug message with the command
-        mock_logger.debug.assert_called_once()
-        debug_msg = mock_logger.debug.call_args[0][0]
-        assert 'test_command' in debug_msg
+    def test_unknown_macro_is_skipped(self, mock_logger):
+        """Test that unknown macros are dropped with a warning."""
+        cmd = Command('+unknown +silent ls')
+        assert cmd.metadata.silent is True
+        assert cmd.command == 'ls'
+        mock_logger.warning.assert_called_once()
 
-    @patch('builder.command.run_command')
-    def test_execute_with_failure_code_1(self, mock_run_command):
-        """Test execution with return code 1."""
-        error = sp.CalledProcessError(1, 'cmd', stderr='')
-        mock_run_command.side_effect = error
+
+    def test_metadata_has_no_instance_dict(self):
+        """Test that command metadata uses slots rather than a per-instance dict."""
+        metadata = _parse('+silent ls').metadata
+        assert isinstance(metadata, CommandMetaData)
+        assert not hasattr(metadata, '__dict__')
+
+class TestRunCommand:
+    """Tests for run_command() with real subprocesses."""
+
+    @patch('builder.command.Logger')
+    def test_run_command_logs_stdout_lines(self, mock_logger):
+        """Test that each stdout line is logged when log is enabled."""
+        run_command('printf "one\ntwo\n"', True)
         
-        cmd = Command('false')
+        logged = [c[0][0] for c in mock_logger.info.call_args_list]
+        assert logged == ['one', 'two']
+
+    @patch('builder.command.Logger')
+    def test_run_command_logs_partial_last_line(self, mock_logger):
+        """Test that output without a trailing newline is still logged."""
+        run_command('printf "no newline"', True)
         
-        with pytest.raises(CommandExecutionError):
-            cmd.execute()
+        logged = [c[0][0] for c in mock_logger.info.call_args_list]
+        assert logged == ['no newline']
 
-    @patch('builder.command.run_command')
-    def test_execute_with_failure_code_127(self, mock_run_command):
-        """Test execution with return code 127 (command not found)."""
-        error = sp.CalledProcessError(127, 'cmd', stderr='command not found')
-        mock_run_command.side_effect = error
+    @patch('builder.command.Logger')
+    def test_run_command_logs_stderr_lines(self, mock_logger):
+        """Test that stderr lines are logged alongside stdout."""
+        run_command('echo out; echo err 1>&2', True)
         
-        cmd = Command('+silent nonexistent_command')
+        logged = [c[0][0] for c in mock_logger.info.call_args_list]
+        assert 'out' in logged
+        assert any('err' in line for line in logged if line != 'out')
+
+    @patch('builder.command.Logger')
+    def test_run_command_logs_large_output(self, mock_logger):
+        """Test that output spanning many read chunks is logged line by line, in order."""
+        run_command('seq 1 20000', True)
         
-        with pytest.raises(CommandExecutionError):
-            cmd.execute()
+        logged = [c[0][0] for c in mock_logger.info.call_args_list]
+        assert logged == [str(i) for i in range(1, 20001)]
 
-    @patch('builder.command.run_command')
-    def test_execute_empty_command_string(self, mock_run_command):
-        """Test execution with empty command after macro stripping."""
-        mock_run_command.return_value = None
+    @patch('builder.command.Logger')
+    def test_run_command_decodes_utf8(self, mock_logger):
+        """Test that non-ASCII output is decoded."""
+        run_command('printf "caf\\303\\251\\n"', True)
         
-        cmd = Command('+always  +silent   ')
-        # Command should be empty string after macro stripping
-        assert cmd.command == ''
-        cmd.execute()
+        mock_logger.info.assert_called_once_with('café')
+
+    @patch('builder.command.Logger')
+    def test_run_command_silent_does_not_log(self, mock_logger):
+        """Test that nothing is logged when log is disabled."""
+        run_command('echo out; echo err 1>&2', False)
         
-        # Should still attempt to run
-        mock_run_command.assert_called_once()
-        assert mock_run_command.call_args[0][0] == ''
+        mock_logger.info.assert_not_called()
 
-    @patch('builder.command.run_command')
-    def test_execute_called_process_error_wrapping(self, mock_run_command):
-        """Test that CalledProcessError is wrapped in CommandExecutionError."""
-        original_error = sp.CalledProcessError(42, 'cmd', stderr='error')
-        mock_run_command.side_effect = original_error
+    @patch('builder.command.Logger')
+    def test_run_command_stderr_only_does_not_block(self, mock_logger):
+        """Test that a command writing only to stderr completes."""
+        run_command('for i in 1 2 3; do echo $i 1>&2; done', True)
         
-        cmd = Command('cmd')
+        assert mock_logger.info.call_count == 3
+
+    def test_run_command_large_silent_output(self):
+        """Test that large output does not fill the pipe and deadlock in silent mode."""
+        run_command('head -c 1000000 /dev/zero', False)
+
+    def test_run_command_failure_raises_with_stderr(self):
+        """Test that a failing command raises CalledProcessError carrying stderr."""
+        with pytest.raises(sp.CalledProcessError) as exc_info:
+            run_command('echo boom 1>&2; exit 3', False)
         
-        with pytest.raises(CommandExecutionError) as exc_info:
-            cmd.execute()
+        assert exc_info.value.returncode == 3
+        assert exc_info.value.stderr == 'boom'
+
+    @patch('builder.command.Logger')
+    def test_run_command_failure_keeps_stderr_when_logging(self, mock_logger):
+        """Test that stderr logged during execution is still attached to the error."""
+        with pytest.raises(sp.CalledProcessError) as exc_info:
+            run_command('echo first 1>&2; echo second 1>&2; exit 1', True)
+        
+        assert exc_info.value.stderr == 'first\nsecond'
+        logged = [c[0][0] for c in mock_logger.info.call_args_list]
+        assert len(logged) == 2
+
+    @patch('builder.command._open_pidfd', return_value=None)
+    @patch('builder.command.Logger')
+    def test_run_command_without_pidfd(self, mock_logger, mock_open_pidfd):
+        """Test the fallback path used when pidfds are not available."""
+        run_command('echo out; echo err 1>&2', True)
         
-        # Should have original error as cause
-        assert exc_info.value.__cause__ is original_error
+        mock_open_pidfd.assert_called_once()
+        assert mock_logger.info.call_count == 2
 
-    @patch('builder.command.run_command')
-    def test_execute_preserves_command_string(self, mock_run_command):
-        """Test that execute doesn't modify the command attribute."""
-        mock_run_command.return_value = None
+    @pytest.mark.skipif(not hasattr(os, 'pidfd_open'), reason='pidfd_open not available')
+    @patch('builder.command.Logger')
+    def test_run_command_returns_on_child_exit(self, mock_logger, tmp_path):
+        """Test that a background process holding the pipes open does not delay completion."""
+        release = tmp_path / 'release'
+        # the background process keeps the pipes open until the release file exists (60s at most)
+        command = f'(for i in $(seq 1200); do [ -e {shlex.quote(str(release))} ] && break; sleep 0.05; done) & echo done'
+        runner = threading.Thread(target=run_command, args=(command, True))
+        runner.start()
+        try:
+            runner.join(timeout=30)
+            assert not runner.is_alive()
+        finally:
+            release.touch()
+            runner.join()
+        mock_logger.info.assert_called_once_with('done')
+
+    @patch('builder.command.Logger')
+    def test_run_command_in_working_directory(self, mock_logger, tmp_path):
+        """Test that the command runs in the given working directory."""
+        run_command('pwd', True, str(tmp_path))
         
-        original_cmd = 'echo "preserve me"'
-        cmd = Command(original_cmd)
-        original_value = cmd.command
+        mock_logger.info.assert_called_once_with(str(tmp_path))
+
+    def test_run_command_silent_in_working_directory(self, tmp_path):
+        """Test that a silent command runs in the given working directory."""
+        run_command('pwd > where.txt', False, str(tmp_path))
         
-        cmd.execute()
+        assert (tmp_path / 'where.txt').read_text().strip() == str(tmp_path)
+
+    @pytest.mark.skipif(not hasattr(os, 'posix_spawn'), reason='posix_spawn not available')
+    @patch('builder.command.sp.Popen')
+    def test_run_command_silent_does_not_use_popen(self, mock_popen):
+        """Test that silent shell commands are spawned directly, without pipes."""
+        run_command('true && true', False)
         
-        # Command should remain unchanged
-        assert cmd.command == original_value
+        mock_popen.assert_not_called()
 
-    @patch('builder.command.run_command')
-    def test_execute_multiple_times(self, mock_run_command):
-        """Test that command can be executed multiple times."""
-        mock_run_command.return_value = None
+    @patch('builder.command.Logger')
+    def test_run_command_silent_without_posix_spawn(self, mock_logger, monkeypatch):
+        """Test the fallback path used when posix_spawn is not available."""
+        monkeypatch.setattr('builder.command.HAS_POSIX_SPAWN', False) # not os.posix_spawn, which subprocess uses itself
+        with patch('builder.command.sp.Popen', wraps=sp.Popen) as mock_popen:
+            with pytest.raises(sp.CalledProcessError) as exc_info:
+                run_command('echo boom 1>&2; exit 2', False)
+        
+        mock_popen.assert_called_once()
+        assert exc_info.value.stderr == 'boom'
+        mock_logger.info.assert_not_called()
+
+    @patch('builder.command.Logger')
+    def test_run_command_without_shell(self, mock_logger, tmp_path):
+        """Test that a simple command is executed without going through /bin/sh."""
+        with patch('builder.command.sp.Popen', wraps=sp.Popen) as mock_popen:
+            run_command('pwd', True, str(tmp_path))
         
-        cmd = Command('echo test')
-        cmd.execute()
-        cmd.execute()
-        cmd.execute()
+        assert mock_popen.call_args.args[0] == ['pwd']
+        mock_logger.info.assert_called_once_with(str(tmp_path))
+
+    def test_run_command_unknown_program_reported_by_shell(self):
+        """Test that a missing program still fails like it does in a shell."""
+        with pytest.raises(sp.CalledProcessError) as exc_info:
+            run_command('builder-no-such-program --version', True)
         
-        # Should be called 3 times
-        assert mock_run_command.call_count == 3
\ No newline at end of file
+        assert exc_info.value.returncode == 127
+        assert 'not found' in exc_info.value.stderr
+
+
+class TestSplitCommand:
+    """Tests for detecting commands that can run without a shell."""
+
+    @pytest.mark.parametrize('command, expected', [
+        ('make all', ['make', 'all']),
+        ('gcc -o "my app" main.c', ['gcc', '-o', 'my app', 'main.c']),
+        ('python -m pip install --prefix=/usr .', ['python', '-m', 'pip', 'install', '--prefix=/usr', '.']),
+    ])
+    def test_simple_commands_are_split(self, command, expected):
+        """Test that commands without shell features are split into arguments."""
+        assert _split_command(command) == expected
+
+    @pytest.mark.parametrize('command', [
+        'make && make install',
+        'echo hi > out.txt',
+        'ls *.c',
+        'echo $HOME',
+        'echo `date`',
+        'CC=clang make',
+        'cd build',
+        'echo "unterminated',
+        '',
+    ])
+    def test_shell_commands_are_not_split(self, command):
+        """Test that commands relying on the shell are left to it."""
+        assert _split_command(command) is None
@@ -1,17 +1,13 @@
 # type: ignore[reportAttributeAccessIssue]import pytest
 
 import pytest
-import io
+from types import SimpleNamespace
 from unittest.mock import Mock
-from contextlib import redirect_stdout, redirect_stderr
 
 from builder.interactive_shell import InteractiveShell
-from builder.rule import Rule
 
 
-@pytest.fixture
-def mock_project():
-    """Create a mock Project instance."""
+def _make_mock_project():
     project = Mock()
     project.get_all_rules = Mock(return_value={})
     project.get_all_vars = Mock(return_value={})
@@ -21,34 +17,48 @@ def mock_project():
 
 
 @pytest.fixture
+def mock_project():
+    """Create a mock Project instance."""
+    return _make_mock_project()
+
+
+@pytest.fixture(scope="module")
 def mock_rules():
-    """Create mock Rule instances."""
+    """Create mock Rule instances, shared by the tests of the module."""
     rules = {}
     
     # Create mock rule 1
-    rule1 = Mock(spec=Rule)
-    rule1.name = 'build'
-    rule1.tags = ['build', 'compile']
-    rule1.commands = ['gcc main.c']
-    rule1.execute = Mock()
-    rule1.get_summary = Mock(return_value="Build Rule Summary")
-    rules['build'] = rule1
+    rules['build'] = SimpleNamespace(
+        name='build',
+        tags=['build', 'compile'],
+        commands=['gcc main.c'],
+        execute=Mock(),
+        get_summary=Mock(return_value="Build Rule Summary"),
+    )
     
     # Create mock rule 2
-    rule2 = Mock(spec=Rule)
-    rule2.name = 'test'
-    rule2.tags = ['test']
-    rule2.commands = ['pytest', 'coverage']
-    rule2.execute = Mock()
-    rule2.get_summary = Mock(return_value="Test Rule Summary")
-    rules['test'] = rule2
+    rules['test'] = SimpleNamespace(
+        name='test',
+        tags=['test'],
+        commands=['pytest', 'coverage'],
+        execute=Mock(),
+        get_summary=Mock(return_value="Test Rule Summary"),
+    )
     
     return rules
 
 
-@pytest.fixture
+@pytest.fixture(autouse=True)
+def reset_mock_rules(mock_rules):
+    """Clear the calls and side effects the previous test left on the shared rules."""
+    for rule in mock_rules.values():
+        rule.execute.reset_mock(side_effect=True)
+        rule.get_summary.reset_mock()
+
+
+@pytest.fixture(scope="session")
 def mock_variables():
-    """Create mock variables."""
+    """Create mock variables (plain data, never mutated by the tests)."""
     return {
         'BUILD_DIR': 'build',
         'SOURCE_DIR': 'src',
@@ -67,6 +77,25 @@ def shell_with_rules(mock_project, mock_rules, mock_variables):
     return InteractiveShell(mock_project)
 
 
+@pytest.fixture(scope="module")
+def mock_project_module():
+    """Create a mock Project instance shared by the tests of the module."""
+    return _make_mock_project()
+
+
+@pytest.fixture(scope="module")
+def shared_shell(mock_project_module):
+    """Create one InteractiveShell for the tests that only read its class attributes (prompt, intro)."""
+    return InteractiveShell(mock_project_module)
+
+
+@pytest.fixture
+def shell_minimal(mock_project):
+    """Create InteractiveShell with a single bare rule, for tests that never run or describe rules."""
+    mock_project.get_all_rules = Mock(return_value={'build': SimpleNamespace(name='build', tags=[], commands=[])})
+    return InteractiveShell(mock_project)
+
+
 @pytest.fixture
 def shell_empty(mock_project):
     """Create InteractiveShell with no rules."""
@@ -86,15 +115,13 @@ class TestInteractiveShellInit:
         assert shell.project == mock_project
         assert shell.rules_dict is not None
     
-    def test_init_sets_prompt(self, mock_project):
+    def test_init_sets_prompt(self, shared_shell):
         """Test that prompt is set correctly."""
-        shell = InteractiveShell(mock_project)
-        assert shell.prompt == "builder> "
+        assert shared_shell.prompt == "builder> "
     
-    def test_init_sets_intro(self, mock_project):
+    def test_init_sets_intro(self, shared_shell):
         """Test that intro is set."""
-        shell = InteractiveShell(mock_project)
-        assert "Builder Interactive Shell" in shell.intro
+        assert "Builder Interactive Shell" in shared_shell.intro
     
     def test_init_populates_rules_dict(self, shell_with_rules, mock_rules):
         """Test that rules_dict is populated from project."""
@@ -106,55 +133,33 @@ class TestInteractiveShellInit:
 class TestDoList:
     """Tests for the list command."""
     
-    def test_list_shows_rules(self, shell_with_rules):
-        """Test that list command shows all rules."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_list("")
+    @pytest.mark.parametrize('needles', [
+        ['build', 'test'],
+        ['build, compile'],
+        ['Rule Name', 'Tags', 'Commands'],
+        ['1', '2'],
+    ], ids=['rules', 'tags', 'headers', 'command-counts'])
+    def test_list_contains(self, shell_with_rules, capsys, needles):
+        """Test that list output shows the rules, their tags and command counts under headers."""
+        shell_with_rules.do_list("")
         
-        result = output.getvalue()
-        assert 'build' in result
-        assert 'test' in result
-    
-    def test_list_shows_headers(self, shell_with_rules):
-        """Test that list command shows column headers."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_list("")
-        
-        result = output.getvalue()
-        assert 'Rule Name' in result
-        assert 'Tags' in result
-        assert 'Commands' in result
-    
-    def test_list_shows_tags(self, shell_with_rules):
-        """Test that list command shows rule tags."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_list("")
-        
-        result = output.getvalue()
-        assert 'build' in result
-        assert 'test' in result
+        result = capsys.readouterr().out
+        for needle in needles:
+            assert needle in result
     
-    def test_list_empty_rules(self, shell_empty):
-        """Test list command with no rules."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_empty.do_list("")
+    def test_list_uses_cached_rules(self, shell_with_rules):
+        """Test that list does not walk the project rules again."""
+        shell_with_rules.project.get_all_rules.reset_mock()
+        shell_with_rules.do_list("")
         
-        result = output.getvalue()
-        assert "No rules available" in result
+        shell_with_rules.project.get_all_rules.assert_not_called()
     
-    def test_list_shows_command_count(self, shell_with_rules):
-        """Test that list shows command count."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_list("")
+    def test_list_empty_rules(self, shell_empty, capsys):
+        """Test list command with no rules."""
+        shell_empty.do_list("")
         
-        result = output.getvalue()
-        # Should show command counts
-        assert '1' in result or '2' in result
+        result = capsys.readouterr().out
+        assert "No rules available" in result
 
 
 class TestDoRun:
@@ -162,57 +167,44 @@ class TestDoRun:
     
     def test_run_single_rule(self, shell_with_rules):
         """Test running a single rule."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_run("build")
+        shell_with_rules.do_run("build")
         
         shell_with_rules.rules_dict['build'].execute.assert_called_once()
     
     def test_run_multiple_rules(self, shell_with_rules):
         """Test running multiple rules."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_run("build test")
+        shell_with_rules.do_run("build test")
         
         shell_with_rules.rules_dict['build'].execute.assert_called_once()
         shell_with_rules.rules_dict['test'].execute.assert_called_once()
     
-    def test_run_shows_rule_name(self, shell_with_rules):
+    def test_run_shows_rule_name(self, shell_with_rules, capsys):
         """Test that run command shows which rule is running."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_run("build")
+        shell_with_rules.do_run("build")
         
-        result = output.getvalue()
+        result = capsys.readouterr().out
         assert 'build' in result
     
-    def test_run_invalid_rule(self, shell_with_rules):
+    def test_run_invalid_rule(self, shell_with_rules, capsys):
         """Test running a non-existent rule."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_run("nonexistent")
+        shell_with_rules.do_run("nonexistent")
         
-        result = output.getvalue()
+        result = capsys.readouterr().out
         assert "Rule not found" in result or "not found" in result.lower()
     
-    def test_run_no_args(self, shell_with_rules):
+    def test_run_no_args(self, shell_with_rules, capsys):
         """Test run command with no arguments."""
-        output = io.StringIO()
-        stderr = io.StringIO()
-        with redirect_stdout(output), redirect_stderr(stderr):
-            shell_with_rules.do_run("")
+        shell_with_rules.do_run("")
         
-        result = output.getvalue() + stderr.getvalue()
+        captured = capsys.readouterr()
+        result = captured.out + captured.err
         assert "specify" in result.lower() or "usage" in result.lower()
     
     def test_run_handles_execution_error(self, shell_with_rules):
         """Test run command when rule execution fails."""
         shell_with_rules.rules_dict['build'].execute.side_effect = RuntimeError("Build failed")
         
-        output = io.StringIO()
-        stderr = io.StringIO()
-        with redirect_stdout(output), redirect_stderr(stderr):
-            shell_with_rules.do_run("build")
+        shell_with_rules.do_run("build")
         
         # Should handle the error gracefully
 
@@ -220,108 +212,66 @@ class TestDoRun:
 class TestDoInfo:
     """Tests for the info command."""
     
+    @pytest.mark.parametrize('arg,needles', [
+        ("build", ['Build Rule Summary']),
+        ("nonexistent", ['Rule not found']),
+        ("invalid", ['Available rules', 'build', 'test']),
+    ])
+    def test_info_contains(self, shell_with_rules, capsys, arg, needles):
+        """Test that info shows the rule summary, or the available rules when the rule is not found."""
+        shell_with_rules.do_info(arg)
+        
+        result = capsys.readouterr().out
+        for needle in needles:
+            assert needle in result
+    
     def test_info_shows_summary(self, shell_with_rules):
         """Test that info command shows rule summary."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_info("build")
+        shell_with_rules.do_info("build")
         
-        result = output.getvalue()
-        # Should call get_summary
         shell_with_rules.rules_dict['build'].get_summary.assert_called_once()
     
-    def test_info_invalid_rule(self, shell_with_rules):
-        """Test info command with invalid rule."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_info("nonexistent")
-        
-        result = output.getvalue()
-        assert "Rule not found" in result or "not found" in result.lower()
-    
-    def test_info_no_args(self, shell_with_rules):
+    def test_info_no_args(self, shell_with_rules, capsys):
         """Test info command with no arguments."""
-        output = io.StringIO()
-        stderr = io.StringIO()
-        with redirect_stdout(output), redirect_stderr(stderr):
-            shell_with_rules.do_info("")
+        shell_with_rules.do_info("")
         
-        result = output.getvalue() + stderr.getvalue()
+        captured = capsys.readouterr()
+        result = captured.out + captured.err
         assert "specify" in result.lower() or "usage" in result.lower()
-    
-    def test_info_shows_available_rules(self, shell_with_rules):
-        """Test that info shows available rules when rule not found."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_info("invalid")
-        
-        result = output.getvalue()
-        assert 'build' in result or 'test' in result
 
 
 class TestDoVars:
     """Tests for the vars command."""
     
-    def test_vars_shows_all_variables(self, shell_with_rules):
-        """Test that vars command shows all variables."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_vars("")
-        
-        result = output.getvalue()
-        assert 'BUILD_DIR' in result
-        assert 'SOURCE_DIR' in result
-        assert 'VERSION' in result
-    
-    def test_vars_shows_values(self, shell_with_rules):
-        """Test that vars command shows variable values."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_vars("")
-        
-        result = output.getvalue()
-        assert 'build' in result  # Value of BUILD_DIR
-        assert '1.0.0' in result  # Value of VERSION
-    
-    def test_vars_single_variable(self, shell_with_rules):
-        """Test vars command for a single variable."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_vars("BUILD_DIR")
-        
-        result = output.getvalue()
-        assert 'BUILD_DIR' in result
-        assert 'build' in result
-    
-    def test_vars_nonexistent_variable(self, shell_with_rules):
-        """Test vars command with nonexistent variable."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_vars("NONEXISTENT")
+    @pytest.mark.parametrize('arg,needles', [
+        ("", ['BUILD_DIR', 'SOURCE_DIR', 'VERSION', 'build', '1.0.0']),
+        ("BUILD_DIR", ['BUILD_DIR = build']),
+        ("NONEXISTENT", ['Variable not found']),
+    ])
+    def test_vars_contains(self, shell_with_rules, capsys, arg, needles):
+        """Test that vars shows all variables, a single one, or reports an unknown one."""
+        shell_with_rules.do_vars(arg)
         
-        result = output.getvalue()
-        assert "Variable not found" in result or "not found" in result.lower()
+        result = capsys.readouterr().out
+        for needle in needles:
+            assert needle in result
     
-    def test_vars_empty(self, shell_empty):
+    def test_vars_empty(self, shell_empty, capsys):
         """Test vars command with no variables."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_empty.do_vars("")
+        shell_empty.do_vars("")
         
-        result = output.getvalue()
+        result = capsys.readouterr().out
         assert "Project Variables" in result
 
 
 class TestDoSummary:
     """Tests for the summary command."""
     
-    def test_summary_shows_project_summary(self, shell_with_rules):
+    def test_summary_shows_project_summary(self, shell_with_rules, capsys):
         """Test that summary command shows project summary."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_summary("")
+        shell_with_rules.do_summary("")
         
-        result = output.getvalue()
+        result = capsys.readouterr().out
         assert "Test Summary" in result  # From mock
     
     def test_summary_calls_project_method(self, shell_with_rules):
@@ -331,31 +281,49 @@ class TestDoSummary:
         shell_with_rules.project.get_summary.assert_called()
 
 
+class TestCompletion:
+    """Tests for rule name completion."""
+    
+    def test_complete_run_matches_prefix(self, shell_with_rules):
+        """Test that run completes rule names starting with the text."""
+        assert shell_with_rules.complete_run("bu", "run bu", 4, 6) == ['build']
+    
+    def test_complete_run_empty_text(self, shell_with_rules):
+        """Test that an empty text completes all rule names."""
+        assert shell_with_rules.complete_run("", "run ", 4, 4) == ['build', 'test']
+    
+    def test_complete_info_matches_prefix(self, shell_with_rules):
+        """Test that info completes rule names starting with the text."""
+        assert shell_with_rules.complete_info("te", "info te", 5, 7) == ['test']
+    
+    def test_complete_no_match(self, shell_with_rules):
+        """Test that unknown prefixes complete nothing."""
+        assert shell_with_rules.complete_run("zz", "run zz", 4, 6) == []
+    
+    def test_complete_empty_shell(self, shell_empty):
+        """Test completion without rules."""
+        assert shell_empty.complete_info("", "info ", 5, 5) == []
+
+
 class TestDoExit:
     """Tests for the exit command."""
     
-    def test_exit_returns_true(self, shell_with_rules):
+    def test_exit_returns_true(self, shell_minimal):
         """Test that exit command returns True."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            result = shell_with_rules.do_exit("")
+        result = shell_minimal.do_exit("")
         
         assert result is True
     
-    def test_exit_prints_goodbye(self, shell_with_rules):
+    def test_exit_prints_goodbye(self, shell_minimal, capsys):
         """Test that exit command prints goodbye."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_exit("")
+        shell_minimal.do_exit("")
         
-        result = output.getvalue()
+        result = capsys.readouterr().out
         assert "Goodbye" in result
     
-    def test_quit_calls_exit(self, shell_with_rules):
+    def test_quit_calls_exit(self, shell_minimal):
         """Test that quit command calls exit."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            result = shell_with_rules.do_quit("")
+        result = shell_minimal.do_quit("")
         
         assert result is True
 
@@ -363,79 +331,54 @@ class TestDoExit:
 class TestDefault:
     """Tests for the default command handler."""
     
-    def test_default_unknown_command(self, shell_with_rules):
+    def test_default_unknown_command(self, shell_minimal, capsys):
         """Test default handler with unknown command."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.default("unknown_command")
+        shell_minimal.default("unknown_command")
         
-        result = output.getvalue()
+        result = capsys.readouterr().out
         assert "Unknown command" in result
     
-    def test_default_eof(self, shell_with_rules):
-        """Test default handler with EOF."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            result = shell_with_rules.default("EOF")
+    @pytest.mark.parametrize('line', ['EOF', 'q'])
+    def test_default_exit_tokens(self, shell_minimal, line):
+        """Test default handler with the EOF and 'q' exit tokens."""
+        result = shell_minimal.default(line)
         
         # default returns result from do_exit, which returns True
         assert result is True or result is None
     
-    def test_default_q(self, shell_with_rules):
-        """Test default handler with 'q'."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            result = shell_with_rules.default("q")
-        
-        # default returns result from do_exit, which returns True
-        assert result is True or result is None
-    
-    def test_default_shows_help_hint(self, shell_with_rules):
+    def test_default_shows_help_hint(self, shell_minimal, capsys):
         """Test that default shows help hint."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.default("invalid")
+        shell_minimal.default("invalid")
         
-        result = output.getvalue()
+        result = capsys.readouterr().out
         assert "help" in result.lower()
 
 
 class TestEmptyline:
     """Tests for handling empty lines."""
     
-    def test_emptyline_returns_false(self, shell_with_rules):
+    def test_emptyline_returns_false(self, shell_minimal):
         """Test that emptyline returns False."""
-        result = shell_with_rules.emptyline()
+        result = shell_minimal.emptyline()
         assert result is False
 
 
+WORKFLOWS = [
+    (('list', ''), ('run', 'build')),
+    (('info', 'build'), ('run', 'build')),
+    (('vars', 'BUILD_DIR'), ('run', 'build')),
+    (('list', ''), ('info', 'build'), ('vars', 'BUILD_DIR'), ('run', 'build'), ('summary', '')),
+]
+
+
 class TestIntegration:
     """Integration tests combining multiple commands."""
     
-    def test_workflow_list_then_run(self, shell_with_rules):
-        """Test workflow: list rules then run one."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_list("")
-            shell_with_rules.do_run("build")
-        
-        shell_with_rules.rules_dict['build'].execute.assert_called_once()
-    
-    def test_workflow_info_then_run(self, shell_with_rules):
-        """Test workflow: show info then run rule."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_info("build")
-            shell_with_rules.do_run("build")
-        
-        shell_with_rules.rules_dict['build'].execute.assert_called_once()
-    
-    def test_workflow_vars_then_run(self, shell_with_rules):
-        """Test workflow: check vars then run rule."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_vars("BUILD_DIR")
-            shell_with_rules.do_run("build")
+    @pytest.mark.parametrize('steps', WORKFLOWS, ids=lambda steps: '-'.join(cmd for cmd, _ in steps))
+    def test_workflow(self, shell_with_rules, steps):
+        """Test that a sequence of commands ends up running the rule once."""
+        for cmd, arg in steps:
+            getattr(shell_with_rules, f'do_{cmd}')(arg)
         
         shell_with_rules.rules_dict['build'].execute.assert_called_once()
 
@@ -443,35 +386,27 @@ class TestIntegration:
 class TestEdgeCases:
     """Tests for edge cases and error conditions."""
     
-    def test_rule_with_no_tags(self, mock_project):
+    def test_rule_with_no_tags(self, mock_project, capsys):
         """Test handling of rule with no tags."""
-        rule = Mock(spec=Rule)
-        rule.name = 'notags'
-        rule.tags = []
-        rule.commands = []
-        rule.execute = Mock()
+        rule = SimpleNamespace(name='notags', tags=[], commands=[], execute=Mock())
         
         mock_project.get_all_rules = Mock(return_value={'notags': rule})
         mock_project.get_all_vars = Mock(return_value={})
         
         shell = InteractiveShell(mock_project)
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell.do_list("")
+        shell.do_list("")
         
-        result = output.getvalue()
+        result = capsys.readouterr().out
         assert 'notags' in result
     
     def test_command_with_extra_spaces(self, shell_with_rules):
         """Test commands with extra spaces."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_run("  build  ")
+        shell_with_rules.do_run("  build  ")
         
         # Extra spaces are handled by split(), so command should still work
         shell_with_rules.rules_dict['build'].execute.assert_called_once()
     
-    def test_variable_with_special_characters(self, mock_project):
+    def test_variable_with_special_characters(self, mock_project, capsys):
         """Test variables with special characters in values."""
         mock_project.get_all_rules = Mock(return_value={})
         mock_project.get_all_vars = Mock(return_value={
@@ -481,29 +416,21 @@ class TestEdgeCases:
         mock_project.vars = mock_project.get_all_vars()
         
         shell = InteractiveShell(mock_project)
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell.do_vars("")
+        shell.do_vars("")
         
-        result = output.getvalue()
+        result = capsys.readouterr().out
         assert 'COMMAND' in result
     
     def test_very_long_rule_name(self, mock_project):
         """Test handling of very long rule names."""
         long_name = "very_long_rule_name_" * 5
-        rule = Mock(spec=Rule)
-        rule.name = long_name
-        rule.tags = ['test']
-        rule.commands = []
-        rule.execute = Mock()
+        rule = SimpleNamespace(name=long_name, tags=['test'], commands=[], execute=Mock())
         
         mock_project.get_all_rules = Mock(return_value={long_name: rule})
         mock_project.get_all_vars = Mock(return_value={})
         
         shell = InteractiveShell(mock_project)
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell.do_run(long_name)
+        shell.do_run(long_name)
         
         rule.execute.assert_called_once()
     
@@ -511,10 +438,7 @@ class TestEdgeCases:
         """Test handling of rule execution exceptions."""
         shell_with_rules.rules_dict['build'].execute.side_effect = Exception("Build error")
         
-        output = io.StringIO()
-        stderr = io.StringIO()
-        with redirect_stdout(output), redirect_stderr(stderr):
-            shell_with_rules.do_run("build")
+        shell_with_rules.do_run("build")
         
         # Should handle exception gracefully
 
@@ -522,18 +446,6 @@ class TestEdgeCases:
 class TestUserInteraction:
     """Tests simulating user interaction patterns."""
     
-    def test_multiple_commands_sequence(self, shell_with_rules):
-        """Test sequence of multiple commands."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_list("")
-            shell_with_rules.do_info("build")
-            shell_with_rules.do_vars("BUILD_DIR")
-            shell_with_rules.do_run("build")
-            shell_with_rules.do_summary("")
-        
-        shell_with_rules.rules_dict['build'].execute.assert_called()
-    
     def test_repeated_run_command(self, shell_with_rules):
         """Test running same rule multiple times."""
         shell_with_rules.do_run("build")
@@ -546,34 +458,28 @@ class TestUserInteraction:
 class TestOutputFormatting:
     """Tests for output formatting."""
     
-    def test_list_output_alignment(self, shell_with_rules):
+    def test_list_output_alignment(self, shell_with_rules, capsys):
         """Test that list output is well-aligned."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_list("")
+        shell_with_rules.do_list("")
         
-        result = output.getvalue()
+        result = capsys.readouterr().out
         lines = result.split('\n')
         
         # Should have header, separator, and data lines
         assert len(lines) > 2
     
-    def test_error_message_format(self, shell_with_rules):
+    def test_error_message_format(self, shell_with_rules, capsys):
         """Test error message formatting."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_run("nonexistent")
+        shell_with_rules.do_run("nonexistent")
         
-        result = output.getvalue()
+        result = capsys.readouterr().out
         assert "not found" in result.lower() or "invalid" in result.lower()
     
-    def test_vars_output_format(self, shell_with_rules):
+    def test_vars_output_format(self, shell_with_rules, capsys):
         """Test variables output format."""
-        output = io.StringIO()
-        with redirect_stdout(output):
-            shell_with_rules.do_vars("")
+        shell_with_rules.do_vars("")
         
-        result = output.getvalue()
+        result = capsys.readouterr().out
         assert "Project Variables" in result
         assert "=" in result or ":" in result
 
@@ -581,21 +487,21 @@ class TestOutputFormatting:
 class TestAttributesAndProperties:
     """Tests for class attributes and properties."""
     
-    def test_project_attribute_set(self, shell_with_rules, mock_project):
+    def test_project_attribute_set(self, shell_minimal, mock_project):
         """Test that project attribute is properly set."""
-        assert shell_with_rules.project == mock_project
+        assert shell_minimal.project == mock_project
     
-    def test_rules_dict_attribute_set(self, shell_with_rules):
+    def test_rules_dict_attribute_set(self, shell_minimal):
         """Test that rules_dict is properly initialized."""
-        assert isinstance(shell_with_rules.rules_dict, dict)
-        assert 'build' in shell_with_rules.rules_dict
+        assert isinstance(shell_minimal.rules_dict, dict)
+        assert 'build' in shell_minimal.rules_dict
     
-    def test_prompt_attribute(self, shell_with_rules):
+    def test_prompt_attribute(self, shared_shell):
         """Test prompt attribute is correct."""
-        assert isinstance(shell_with_rules.prompt, str)
-        assert "builder" in shell_with_rules.prompt.lower()
+        assert isinstance(shared_shell.prompt, str)
+        assert "builder" in shared_shell.prompt.lower()
     
-    def test_intro_contains_welcome(self, shell_with_rules):
+    def test_intro_contains_welcome(self, shared_shell):
         """Test intro contains welcome message."""
-        assert isinstance(shell_with_rules.intro, str)
-        assert len(shell_with_rules.intro) > 0
+        assert isinstance(shared_shell.intro, str)
+        assert len(shared_shell.intro) > 0
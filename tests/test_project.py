@@ -3,152 +3,86 @@
 import pytest
 import os
 import sys
-import tempfile
+import re
+import shlex
+import shutil
+import subprocess
+import time
 import yaml
 from unittest.mock import patch
 
-from builder.project import Project
+from builder.project import Project, YamlLoader, _run_shell, _prefetch_commands, _load_yaml, _ShellSession, _shell_output, _idle_shells
 from builder.rule import Rule
+from builder.utils import VAR_RE
 
-
-@pytest.fixture
-def temp_dir():
-    """Create a temporary directory for test files."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        yield tmpdir
-
-
-@pytest.fixture
-def basic_config(temp_dir):
-    """Create a basic build.yml configuration file."""
-    config = {
-        'vars': {
-            'BUILD_DIR': 'build',
-            'SOURCE_DIR': 'src',
-        },
-        'rules': {
-            'compile': {
-                'tags': ['build'],
-                'required-files': ['src/main.py'],
-                'expected-files': ['build/output.txt'],
-                'commands': ['echo "compiling"'],
-            },
-            'test': {
-                'tags': ['test'],
-                'required-files': ['tests/test_*.py'],
-                'expected-files': [],
-                'commands': ['pytest'],
-            }
-        }
-    }
-    config_file = os.path.join(temp_dir, 'build.yml')
-    with open(config_file, 'w') as f:
-        yaml.dump(config, f)
-    return config_file
+try: # write configs with the libyaml emitter when available, as Project reads them with libyaml's parser
+    from yaml import CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeDumper as YamlDumper
 
 
 @pytest.fixture
-def config_with_imports(temp_dir):
-    """Create a config file with imports."""
-    # Create sub-project
-    sub_dir = os.path.join(temp_dir, 'subproject')
-    os.makedirs(sub_dir, exist_ok=True)
-    
-    sub_config = {
-        'vars': {
-            'SUB_VAR': 'sub_value',
-        },
-        'rules': {
-            'sub_rule': {
-                'tags': ['sub'],
-                'required-files': [],
-                'expected-files': [],
-                'commands': ['echo "sub"'],
-            }
-        }
-    }
-    sub_config_file = os.path.join(sub_dir, 'build.yml')
-    with open(sub_config_file, 'w') as f:
-        yaml.dump(sub_config, f)
-    
-    # Create main config
-    main_config = {
-        'imports': [
-            {'path': 'subproject/build.yml', 'as': 'sub'},
-        ],
-        'vars': {
-            'MAIN_VAR': 'main_value',
-        },
-        'rules': {}
-    }
-    main_config_file = os.path.join(temp_dir, 'build.yml')
-    with open(main_config_file, 'w') as f:
-        yaml.dump(main_config, f)
-    
-    return main_config_file
+def temp_dir(tmp_path):
+    """Create a temporary directory for test files (under pytest's base temp, so each xdist worker gets its own)."""
+    return str(tmp_path)
 
 
 @pytest.fixture
-def config_with_variables(temp_dir):
-    """Create a config with variable substitution."""
-    config = {
-        'vars': {
-            'BASE': '/path/to',
-            'NESTED': '${BASE}/nested',
-        },
-        'rules': {
-            'build': {
-                'tags': ['build'],
-                'required-files': ['${BASE}/input.txt'],
-                'expected-files': ['${NESTED}/output.txt'],
-                'commands': ['echo "${NESTED}"'],
-            }
-        }
-    }
-    config_file = os.path.join(temp_dir, 'build.yml')
-    with open(config_file, 'w') as f:
-        yaml.dump(config, f)
-    return config_file
+def shell_cache():
+    """Start with an empty $(command) expansion cache, and empty it again afterwards, so results of stubbed
+    shells are neither reused by the test nor left to later tests of the worker."""
+    _run_shell.cache_clear()
+    yield
+    _run_shell.cache_clear()
+
+
+@pytest.fixture(scope='module')
+def basic_project(basic_config):
+    """Load basic_config once for the tests that only read the project."""
+    return Project(basic_config)
+
+
+@pytest.fixture(scope='module')
+def imports_project(config_with_imports):
+    """Load config_with_imports once for the tests that only read the project."""
+    return Project(config_with_imports)
+
+
+DEPENDENCIES_CONFIG = """\
+rules:
+  package:
+    depends-on: [link, docs]
+    commands: ['echo "package"']
+  link:
+    depends-on: [compile]
+    expected-files: [app]
+    commands: ['echo "link"']
+  compile:
+    expected-files: [main.o]
+    commands: ['echo "compile"']
+  docs:
+    expected-files: [app]
+    commands: ['echo "docs"']
+"""
 
 
 @pytest.fixture
-def config_with_file_groups(temp_dir):
-    """Create a config with file groups."""
-    config = {
-        'files-groups': {
-            'source_files': ['src/main.py', 'src/utils.py'],
-            'test_files': ['tests/test_*.py'],
-        },
-        'rules': {
-            'build': {
-                'tags': ['build'],
-                'required-files': 'source_files',
-                'expected-files': ['build/app'],
-                'commands': ['python -m py_compile ${BUILD_DIR}'],
-            }
-        },
-        'vars': {
-            'BUILD_DIR': 'build',
-        }
-    }
-    config_file = os.path.join(temp_dir, 'build.yml')
-    with open(config_file, 'w') as f:
-        yaml.dump(config, f)
-    return config_file
+def config_with_dependencies(config_writer):
+    """Create a config file whose rules depend on each other."""
+    return config_writer(DEPENDENCIES_CONFIG)
 
 
 class TestProjectInitialization:
     """Tests for Project initialization."""
     
-    def test_init_with_basic_config(self, basic_config):
+    def test_init_with_basic_config(self, basic_config, basic_project):
         """Test basic project initialization."""
-        project = Project(basic_config)
-        assert project.config_file == os.path.abspath(basic_config)
-        assert 'BUILD_DIR' in project.vars
-        assert project.vars['BUILD_DIR'] == 'build'
-        assert len(project.rules) == 2
-        assert 'compile' in project.rules
-        assert 'test' in project.rules
+        assert basic_project.config_file == os.path.abspath(basic_config)
+        assert 'BUILD_DIR' in basic_project.vars
+        assert basic_project.vars['BUILD_DIR'] == 'build'
+        assert len(basic_project.rules) == 2
+        assert 'compile' in basic_project.rules
+        assert 'test' in basic_project.rules
     
     def test_init_with_command_line_variables(self, basic_config):
         """Test initialization with command line variables."""
@@ -165,21 +99,17 @@ class TestProjectInitialization:
         assert 'PYTHON' in project.vars
         assert project.vars['PYTHON'] == sys.executable
     
-    def test_init_creates_rule_objects(self, basic_config):
+    def test_init_creates_rule_objects(self, basic_project):
         """Test that rules are properly instantiated."""
-        project = Project(basic_config)
-        for rule_name, rule in project.rules.items():
-            assert isinstance(rule, Rule)
-            assert rule.name == rule_name
+        assert all(isinstance(rule, Rule) and rule.name == rule_name for rule_name, rule in basic_project.rules.items())
 
 
 class TestProjectConfigLoading:
     """Tests for config file loading."""
     
-    def test_load_config_yaml(self, basic_config):
+    def test_load_config_yaml(self, basic_project):
         """Test loading YAML configuration."""
-        project = Project(basic_config)
-        assert len(project.rules) > 0
+        assert len(basic_project.rules) > 0
     
     def test_load_config_file_not_found(self, temp_dir):
         """Test error when config file doesn't exist."""
@@ -191,10 +121,46 @@ class TestProjectConfigLoading:
         """Test error with invalid YAML."""
         invalid_config = os.path.join(temp_dir, 'invalid.yml')
         with open(invalid_config, 'w') as f:
-            f.write("invalid: yaml: content: [")
-        with pytest.raises(Exception):  # yaml.YAMLError
+            f.write("- [\n") # unterminated flow sequence
+        with pytest.raises(yaml.YAMLError):
             Project(invalid_config)
+    
+    def test_load_config_parsed_once(self, basic_config):
+        """Test that loading the same unchanged file twice parses it once."""
+        _load_yaml.cache_clear()
+        with patch('builder.project.yaml.load', wraps=yaml.load) as mock_load:
+            Project(basic_config)
+            Project(basic_config)
+        mock_load.assert_called_once()
+    
+    def test_load_config_force_reload(self, config_with_imports):
+        """Test that force_reload parses the project and its imports again, even if they are cached."""
+        Project(config_with_imports)
+        with patch('builder.project.yaml.load', wraps=yaml.load) as mock_load:
+            Project(config_with_imports, force_reload=True)
+        assert mock_load.call_count == 2
+    
+    def test_load_config_reparsed_when_modified(self, basic_config, temp_dir):
+        """Test that a modified file is parsed again."""
+        config_file = shutil.copy(basic_config, temp_dir)
+        Project(config_file)
+        with open(config_file, 'a') as f:
+            f.write("\nfiles-groups:\n  group: [a.txt]\n")
+        project = Project(config_file)
+        assert project.files_groups == {'group': ['a.txt']}
 
+    
+    def test_load_config_uses_libyaml_when_available(self):
+        """Test that configs are parsed with libyaml's safe loader whenever PyYAML was built with it."""
+        assert YamlLoader is (yaml.CSafeLoader if yaml.__with_libyaml__ else yaml.SafeLoader)
+    
+    def test_load_config_rejects_python_tags(self, temp_dir):
+        """Test that configs are parsed with a safe loader, whichever implementation is used."""
+        unsafe_config = os.path.join(temp_dir, 'unsafe.yml')
+        with open(unsafe_config, 'w') as f:
+            f.write("vars:\n  X: !!python/object/apply:os.getcwd []\n")
+        with pytest.raises(yaml.YAMLError):
+            Project(unsafe_config)
 
 class TestVariableResolution:
     """Tests for variable resolution and substitution."""
@@ -212,16 +178,108 @@ class TestVariableResolution:
         project = Project(config_with_variables)
         assert project.vars['NESTED'] == '/path/to/nested'
     
-    def test_resolve_command_execution(self, basic_config):
+    def test_resolve_unknown_variable_kept(self, basic_config):
+        """Test references to undefined variables are left untouched."""
+        project = Project(basic_config)
+        project.vars['VAR'] = '${UNDEFINED}/${BUILD_DIR}'
+        project._Project__resolve_all_variables()
+        assert project.vars['VAR'] == '${UNDEFINED}/build'
+    
+    def test_resolve_several_references(self, basic_config):
+        """Test several references in one value are all substituted."""
+        project = Project(basic_config)
+        project.vars['VAR'] = '${SOURCE_DIR}:${BUILD_DIR}:${SOURCE_DIR}'
+        project._Project__resolve_all_variables()
+        assert project.vars['VAR'] == 'src:build:src'
+    
+    def test_resolve_stops_without_new_references(self, basic_config):
+        """Test a value whose substitutions bring no new reference is scanned once."""
+        project = Project(basic_config)
+        with patch('builder.project.VAR_RE', wraps=VAR_RE) as mock_re:
+            value = project._Project__resolve_variable_value('${SOURCE_DIR}/main.c', {'SOURCE_DIR': 'src'})
+        assert value == 'src/main.c'
+        assert mock_re.sub.call_count == 1
+    
+    def test_resolve_nested_containers_copied(self, basic_config):
+        """Test nested values are resolved without modifying the original containers."""
+        project = Project(basic_config)
+        original = {'paths': ['${SOURCE_DIR}/a.c', {'out': '${BUILD_DIR}/a.o'}], 'count': 2}
+        project.vars['NESTED'] = original
+        project._Project__resolve_all_variables()
+        assert project.vars['NESTED'] == {'paths': ['src/a.c', {'out': 'build/a.o'}], 'count': 2}
+        assert original == {'paths': ['${SOURCE_DIR}/a.c', {'out': '${BUILD_DIR}/a.o'}], 'count': 2}
+    
+    def test_resolve_skips_values_without_references(self, basic_config):
+        """Test only values with references go through resolution."""
+        project = Project(basic_config)
+        project.vars['PLAIN'] = 'nothing to resolve'
+        project.vars['NESTED_PLAIN'] = {'a': ['b', 'c']}
+        project.vars['REF'] = '${SOURCE_DIR}/main.c'
+        with patch.object(Project, '_Project__resolve_variable_value', autospec=True, side_effect=lambda self, value, variables: value) as mock_resolve:
+            project._Project__resolve_all_variables()
+        resolved = [c.args[1] for c in mock_resolve.call_args_list]
+        assert '${SOURCE_DIR}/main.c' in resolved
+        assert 'nothing to resolve' not in resolved
+        assert 'b' not in resolved
+        assert project.vars['NESTED_PLAIN'] == {'a': ['b', 'c']}
+    
+    def test_resolve_forward_reference_single_pass(self, basic_config):
+        """Test a variable referencing a later one is resolved after it."""
+        project = Project(basic_config)
+        project.vars['FIRST'] = '${SECOND}/a'
+        project.vars['SECOND'] = '${THIRD}/b'
+        project.vars['THIRD'] = 'c'
+        order = project._Project__resolution_order()
+        assert order.index('THIRD') < order.index('SECOND') < order.index('FIRST')
+        project._Project__resolve_all_variables()
+        assert project.vars['FIRST'] == 'c/b/a'
+    
+    def test_resolve_circular_chain_terminates(self, basic_config):
+        """Test a reference cycle through several variables does not loop forever."""
+        project = Project(basic_config)
+        project.vars['A'] = '${B}'
+        project.vars['B'] = '${C}'
+        project.vars['C'] = '${A}'
+        project._Project__resolve_all_variables()
+        assert project.vars['A'] in ('${A}', '${B}', '${C}')
+    
+    def test_resolve_command_execution(self, basic_config, monkeypatch, shell_cache):
         """Test command execution in variable resolution."""
         project = Project(basic_config)
+        commands = []
+        monkeypatch.setattr('builder.project._shell_output', lambda command: commands.append(command) or 'testuser\n')
         project.vars['USER_NAME'] = '$(echo "testuser")'
         project._Project__resolve_all_variables()
         assert project.vars['USER_NAME'] == 'testuser'
+        assert commands == ['echo "testuser"']
     
-    def test_resolve_command_with_error(self, basic_config):
+    def test_resolve_several_commands(self, basic_config):
+        """Test every command of a value is expanded."""
+        project = Project(basic_config)
+        project.vars['BOTH'] = '$(echo a)-$(echo b)-${BUILD_DIR}'
+        project._Project__resolve_all_variables()
+        assert project.vars['BOTH'] == 'a-b-build'
+    
+    def test_resolve_nested_command(self, basic_config):
+        """Test a nested command is run by the shell expanding the outer one."""
+        project = Project(basic_config)
+        project.vars['NESTED_CMD'] = '$(echo $(echo inner) outer)'
+        project._Project__resolve_all_variables()
+        assert project.vars['NESTED_CMD'] == 'inner outer'
+    
+    def test_resolve_unterminated_command_kept(self, basic_config):
+        """Test an unterminated expansion is left as it is."""
+        project = Project(basic_config)
+        project.vars['BROKEN'] = 'value $(echo a'
+        project._Project__resolve_all_variables()
+        assert project.vars['BROKEN'] == 'value $(echo a'
+    
+    def test_resolve_command_with_error(self, basic_config, monkeypatch, shell_cache):
         """Test handling of failed command execution."""
         project = Project(basic_config)
+        def failing_output(command):
+            raise subprocess.CalledProcessError(1, command, stderr='')
+        monkeypatch.setattr('builder.project._shell_output', failing_output)
         project.vars['FAIL_CMD'] = '$(exit 1)'
         with pytest.raises(ValueError, match='Failed to execute command'):
             project._Project__resolve_all_variables()
@@ -241,6 +299,138 @@ class TestVariableResolution:
         assert project.vars['DICT_VAR'] == {'key1': 'value1', 'key2': 'value2'}
 
 
+@pytest.mark.usefixtures('shell_cache')
+class TestShellExpansionCache:
+    """Tests for the memoized $(command) expansion."""
+    
+    def test_same_command_runs_once(self, temp_dir):
+        """Test a command used in several variables is only run once."""
+        config = {'vars': {
+            'A': '$(echo "shared-cmd")',
+            'B': 'prefix-$(echo "shared-cmd")',
+        }}
+        config_file = os.path.join(temp_dir, 'build.yml')
+        with open(config_file, 'w') as f:
+            yaml.dump(config, f, Dumper=YamlDumper)
+        with patch('builder.project._shell_output', return_value='shared\n') as mock_shell_output:
+            project = Project(config_file)
+        assert project.vars['A'] == 'shared'
+        assert project.vars['B'] == 'prefix-shared'
+        mock_shell_output.assert_called_once()
+    
+    def test_same_command_runs_once_across_imports(self, temp_dir):
+        """Test a command shared by imported projects loaded concurrently is only run once."""
+        for name in ('a', 'b'):
+            with open(os.path.join(temp_dir, f'{name}.yml'), 'w') as f:
+                yaml.dump({'vars': {'REV': '$(git-rev-cmd)'}, 'rules': {}}, f, Dumper=YamlDumper)
+        config_file = os.path.join(temp_dir, 'build.yml')
+        with open(config_file, 'w') as f:
+            yaml.dump({'imports': [{'path': 'a.yml', 'as': 'first'}, {'path': 'b.yml', 'as': 'second'}], 'rules': {}}, f, Dumper=YamlDumper)
+        def slow_output(command):
+            time.sleep(0.2) # long enough for both imports to ask for it
+            return 'abc123\n'
+        with patch('builder.project._shell_output', side_effect=slow_output) as mock_shell_output:
+            project = Project(config_file)
+        assert project.get_var('first.REV') == project.get_var('second.REV') == 'abc123'
+        mock_shell_output.assert_called_once_with('git-rev-cmd')
+    
+    def test_commands_run_concurrently(self, temp_dir):
+        """Test independent commands are run in parallel."""
+        def overlapping(name):
+            # marks itself as started, then waits (10s at most) for the other commands to start too
+            others = ' '.join(shlex.quote(os.path.join(temp_dir, f'{other}.started')) for other in 'abc' if other != name)
+            return (f'$(touch {shlex.quote(os.path.join(temp_dir, f"{name}.started"))}; '
+                    f'for i in $(seq 200); do ls {others} >/dev/null 2>&1 && break; sleep 0.05; done; '
+                    f'ls {others} >/dev/null 2>&1 && echo {name} || echo alone)')
+        config = {'vars': {name.upper(): overlapping(name) for name in 'abc'}}
+        config_file = os.path.join(temp_dir, 'build.yml')
+        with open(config_file, 'w') as f:
+            yaml.dump(config, f, Dumper=YamlDumper)
+        project = Project(config_file)
+        assert (project.vars['A'], project.vars['B'], project.vars['C']) == ('a', 'b', 'c')
+    
+    def test_commands_with_references_not_prefetched(self):
+        """Test commands depending on variables are left to the resolution pass."""
+        with patch('builder.project._run_shell') as mock_run_shell:
+            _prefetch_commands(['$(echo ${NAME})', {'key': ['$(echo a)']}, '$(echo b)'])
+        assert sorted(c[0][0] for c in mock_run_shell.call_args_list) == ['echo a', 'echo b']
+    
+    def test_failed_prefetch_reported_on_resolution(self, basic_config):
+        """Test a failing command still raises when its variable is resolved."""
+        project = Project(basic_config)
+        project.vars['OK'] = '$(echo ok)'
+        project.vars['FAIL_CMD'] = '$(exit 3)'
+        with pytest.raises(ValueError, match='Failed to execute command'):
+            project._Project__resolve_all_variables()
+
+
+
+class TestShellSession:
+    """Tests for the persistent shell running $(command) expansions."""
+    
+    @pytest.fixture
+    def session(self):
+        session = _ShellSession()
+        yield session
+        session.close()
+    
+    def test_run_returns_output(self, session):
+        """Test the exact output of successive commands is returned."""
+        assert session.run('echo hello') == 'hello\n'
+        assert session.run('printf abc') == 'abc'
+        assert session.run('true') == ''
+    
+    def test_commands_are_isolated(self, session):
+        """Test a command can't change the state seen by the next ones."""
+        cwd = session.run('pwd')
+        session.run('cd / && FOO=bar')
+        assert session.run('pwd') == cwd
+        assert session.run('echo "${FOO}"') == '\n'
+    
+    def test_failure_raises_with_stderr(self, session):
+        """Test a failing command raises CalledProcessError with its exit code and stderr."""
+        with pytest.raises(subprocess.CalledProcessError) as exc_info:
+            session.run('echo oops >&2; exit 4')
+        assert exc_info.value.returncode == 4
+        assert exc_info.value.stderr == 'oops\n'
+        assert session.run('echo still alive') == 'still alive\n'
+    
+    def test_syntax_error_does_not_break_session(self, session):
+        """Test an unparsable command fails without leaving the shell waiting for input."""
+        with pytest.raises(subprocess.CalledProcessError):
+            session.run('echo "unterminated')
+        assert session.run('echo ok') == 'ok\n'
+    
+    def test_command_does_not_read_session_input(self, session):
+        """Test commands reading stdin get an empty input."""
+        assert session.run('cat') == ''
+        assert session.run('echo next') == 'next\n'
+
+
+class TestShellOutput:
+    """Tests for running $(command) expansions on the pool of shell sessions."""
+    
+    def test_invalid_utf8_output_does_not_leak(self):
+        """Test output that isn't valid UTF-8 is decoded with replacements, and the next command gets its own result."""
+        with pytest.raises(subprocess.CalledProcessError) as exc_info:
+            _shell_output("printf 'a\\377b\\n'; exit 3")
+        assert exc_info.value.returncode == 3
+        assert exc_info.value.output == 'a\ufffdb\n'
+        assert _shell_output('echo second') == 'second\n'
+    
+    def test_session_discarded_on_unexpected_error(self, monkeypatch):
+        """Test a session whose output couldn't be read is closed instead of going back to the pool."""
+        sessions = []
+        def failing_run(session, command):
+            sessions.append(session)
+            raise RuntimeError('read failed')
+        monkeypatch.setattr(_ShellSession, 'run', failing_run)
+        with pytest.raises(RuntimeError, match='read failed'):
+            _shell_output('echo first')
+        assert sessions[0] not in _idle_shells
+        assert sessions[0].process.poll() is not None
+
+
 class TestImports:
     """Tests for project imports."""
     
@@ -250,18 +440,8 @@ class TestImports:
         assert 'sub' in project.imports
         assert isinstance(project.imports['sub'], Project)
     
-    def test_import_with_custom_alias(self, temp_dir):
+    def test_import_with_custom_alias(self, project_dir):
         """Test imports with custom aliases."""
-        sub_dir = os.path.join(temp_dir, 'subproject')
-        os.makedirs(sub_dir, exist_ok=True)
-        
-        sub_config = {
-            'vars': {'SUB_VAR': 'sub_value'},
-            'rules': {}
-        }
-        with open(os.path.join(sub_dir, 'build.yml'), 'w') as f:
-            yaml.dump(sub_config, f)
-        
         main_config = {
             'imports': [
                 {'path': 'subproject/build.yml', 'as': 'custom_alias'},
@@ -269,27 +449,16 @@ class TestImports:
             'vars': {},
             'rules': {}
         }
-        main_config_file = os.path.join(temp_dir, 'build.yml')
+        main_config_file = os.path.join(project_dir, 'build.yml')
         with open(main_config_file, 'w') as f:
-            yaml.dump(main_config, f)
+            yaml.dump(main_config, f, Dumper=YamlDumper)
         
         project = Project(main_config_file)
         assert 'custom_alias' in project.imports
         assert 'custom_alias' not in project.imports or 'build' not in project.imports
     
-    def test_import_project_file_parsing(self, temp_dir):
+    def test_import_project_file_parsing(self, project_dir):
         """Test loading project files like pyproject.toml."""
-        # Create a pyproject.toml file
-        pyproject_data = {
-            'project': {
-                'name': 'test_project',
-                'version': '1.0.0',
-            }
-        }
-        pyproject_file = os.path.join(temp_dir, 'pyproject.toml')
-        with open(pyproject_file, 'w') as f:
-            f.write('[project]\nname = "test_project"\nversion = "1.0.0"\n')
-        
         main_config = {
             'imports': [
                 {'path': 'pyproject.toml', 'as': 'project_info'},
@@ -297,15 +466,52 @@ class TestImports:
             'vars': {},
             'rules': {}
         }
-        main_config_file = os.path.join(temp_dir, 'build.yml')
+        main_config_file = os.path.join(project_dir, 'build.yml')
         with open(main_config_file, 'w') as f:
-            yaml.dump(main_config, f)
+            yaml.dump(main_config, f, Dumper=YamlDumper)
         
         project = Project(main_config_file)
         # Check that project file vars are loaded
         assert 'project_info.name' in project.vars
 
 
+    def test_several_sub_projects_keep_order(self, temp_dir):
+        """Test several sub-projects are all loaded, in declaration order."""
+        aliases = ['zeta', 'alpha', 'mid']
+        for alias in aliases:
+            sub_dir = os.path.join(temp_dir, alias)
+            os.makedirs(sub_dir)
+            with open(os.path.join(sub_dir, 'build.yml'), 'w') as f:
+                yaml.dump({'vars': {'NAME': alias}, 'rules': {}}, f, Dumper=YamlDumper)
+        main_config = {
+            'imports': [{'path': alias, 'as': alias} for alias in aliases],
+            'rules': {},
+        }
+        main_config_file = os.path.join(temp_dir, 'build.yml')
+        with open(main_config_file, 'w') as f:
+            yaml.dump(main_config, f, Dumper=YamlDumper)
+        
+        project = Project(main_config_file)
+        assert list(project.imports) == aliases
+        assert [project.get_var(f'{alias}.NAME') for alias in aliases] == aliases
+    
+    def test_sub_project_error_propagates(self, temp_dir):
+        """Test an error loading one of several sub-projects is raised."""
+        for name in ('ok', 'broken'):
+            os.makedirs(os.path.join(temp_dir, name))
+        with open(os.path.join(temp_dir, 'ok', 'build.yml'), 'w') as f:
+            yaml.dump({'rules': {}}, f, Dumper=YamlDumper)
+        with open(os.path.join(temp_dir, 'broken', 'build.yml'), 'w') as f:
+            f.write("vars:\n  FAIL: $(exit 1)\n")
+        main_config = {'imports': [{'path': 'ok'}, {'path': 'broken'}], 'rules': {}}
+        main_config_file = os.path.join(temp_dir, 'build.yml')
+        with open(main_config_file, 'w') as f:
+            yaml.dump(main_config, f, Dumper=YamlDumper)
+        
+        with pytest.raises(ValueError, match='Failed to execute command'):
+            Project(main_config_file)
+
+
 class TestFileGroups:
     """Tests for file groups handling."""
     
@@ -325,152 +531,180 @@ class TestFileGroups:
 class TestSelectRules:
     """Tests for rule selection."""
     
-    def test_select_rules_by_name(self, basic_config):
+    def test_select_rules_by_name(self, basic_project):
         """Test selecting rules by name."""
-        project = Project(basic_config)
-        selected = project.select_rules(['compile'], [])
+        selected = basic_project.select_rules(['compile'], [])
         assert 'compile' in selected
         assert 'test' not in selected
     
-    def test_select_rules_by_name_pattern(self, basic_config):
+    def test_select_rules_by_name_pattern(self, basic_project):
         """Test selecting rules by name pattern."""
-        project = Project(basic_config)
-        selected = project.select_rules(['test*'], [])
+        selected = basic_project.select_rules(['test*'], [])
         assert 'test' in selected
         assert 'compile' not in selected
     
-    def test_select_rules_by_tag(self, basic_config):
+    def test_select_rules_by_tag(self, basic_project):
         """Test selecting rules by tag."""
-        project = Project(basic_config)
-        selected = project.select_rules([], ['build'])
+        selected = basic_project.select_rules([], ['build'])
         assert 'compile' in selected
         assert 'test' not in selected
     
-    def test_select_rules_by_tag_and_name(self, basic_config):
+    def test_select_rules_by_tag_and_name(self, basic_project):
         """Test selecting rules by both name and tag."""
-        project = Project(basic_config)
-        selected = project.select_rules(['compile'], ['build'])
+        selected = basic_project.select_rules(['compile'], ['build'])
         assert 'compile' in selected
     
-    def test_select_rules_empty_criteria(self, basic_config):
+    def test_select_rules_empty_criteria(self, basic_project):
         """Test selecting all rules when no criteria provided."""
-        project = Project(basic_config)
-        selected = project.select_rules([], [])
-        assert len(selected) == len(project.rules)
+        selected = basic_project.select_rules([], [])
+        assert len(selected) == len(basic_project.rules)
+
+    
+    def test_select_rules_compiles_patterns_once(self, basic_project):
+        """Test each name pattern is compiled once, not once per rule."""
+        with patch('builder.project.re.compile', wraps=re.compile) as mock_compile:
+            basic_project.select_rules(['comp.*', 'te.*'], [])
+        compiled = [c.args[0] for c in mock_compile.call_args_list if c.args[0] in ('comp.*', 'te.*')]
+        assert sorted(compiled) == ['comp.*', 'te.*']
+    
+    def test_select_rules_does_not_expand_files(self, basic_config):
+        """Test that selecting rules doesn't expand their file patterns."""
+        with patch('builder.rule.expand_files') as mock_expand:
+            project = Project(basic_config)
+            project.select_rules([], ['build'])
+        mock_expand.assert_not_called()
 
 
 class TestGetters:
     """Tests for getter methods."""
     
-    def test_get_rule_by_name(self, basic_config):
+    def test_get_rule_by_name(self, basic_project):
         """Test getting a rule by name."""
-        project = Project(basic_config)
-        rule = project.get_rule('compile')
+        rule = basic_project.get_rule('compile')
         assert isinstance(rule, Rule)
         assert rule.name == 'compile'
     
-    def test_get_rule_not_found(self, basic_config):
+    def test_get_rule_not_found(self, basic_project):
         """Test error when rule not found."""
-        project = Project(basic_config)
         with pytest.raises(KeyError):
-            project.get_rule('nonexistent')
+            basic_project.get_rule('nonexistent')
     
-    def test_get_var_by_name(self, basic_config):
+    def test_get_var_by_name(self, basic_project):
         """Test getting a variable by name."""
-        project = Project(basic_config)
-        var = project.get_var('BUILD_DIR')
+        var = basic_project.get_var('BUILD_DIR')
         assert var == 'build'
     
-    def test_get_var_not_found(self, basic_config):
+    def test_get_var_not_found(self, basic_project):
         """Test error when variable not found."""
-        project = Project(basic_config)
         with pytest.raises(KeyError):
-            project.get_var('nonexistent_var')
+            basic_project.get_var('nonexistent_var')
     
-    def test_get_method_returns_rule(self, basic_config):
+    def test_get_method_returns_rule(self, basic_project):
         """Test get() method returns rule."""
-        project = Project(basic_config)
-        rule = project.get('compile')
+        rule = basic_project.get('compile')
         assert isinstance(rule, Rule)
     
-    def test_get_method_returns_var(self, basic_config):
+    def test_get_method_returns_var(self, basic_project):
         """Test get() method returns variable."""
-        project = Project(basic_config)
-        var = project.get('BUILD_DIR')
+        var = basic_project.get('BUILD_DIR')
         assert var == 'build'
 
 
 class TestGettersWithImports:
     """Tests for getters with imported projects."""
     
-    def test_get_imported_rule(self, config_with_imports):
+    def test_get_imported_rule(self, imports_project):
         """Test getting a rule from imported project."""
-        project = Project(config_with_imports)
-        rule = project.get_rule('sub.sub_rule')
+        rule = imports_project.get_rule('sub.sub_rule')
         assert isinstance(rule, Rule)
         assert rule.name == 'sub_rule'
     
-    def test_get_imported_var(self, config_with_imports):
+    def test_get_imported_var(self, imports_project):
         """Test getting a variable from imported project."""
-        project = Project(config_with_imports)
-        var = project.get_var('sub.SUB_VAR')
+        var = imports_project.get_var('sub.SUB_VAR')
         assert var == 'sub_value'
     
-    def test_get_imported_rule_not_found(self, config_with_imports):
+    def test_get_imported_rule_not_found(self, imports_project):
         """Test error when imported rule not found."""
-        project = Project(config_with_imports)
         with pytest.raises(KeyError):
-            project.get_rule('sub.nonexistent')
+            imports_project.get_rule('sub.nonexistent')
     
-    def test_get_all_rules_includes_imports(self, config_with_imports):
+    def test_get_all_rules_includes_imports(self, imports_project):
         """Test that get_all_rules includes imported rules."""
-        project = Project(config_with_imports)
-        all_rules = project.get_all_rules()
+        all_rules = imports_project.get_all_rules()
         assert 'sub.sub_rule' in all_rules
     
-    def test_get_all_vars_includes_imports(self, config_with_imports):
+    def test_get_all_rules_is_cached(self, imports_project):
+        """Test that get_all_rules walks the imports only once."""
+        assert imports_project.get_all_rules() is imports_project.get_all_rules()
+    
+    def test_get_all_vars_includes_imports(self, imports_project):
         """Test that get_all_vars includes imported variables."""
-        project = Project(config_with_imports)
-        all_vars = project.get_all_vars()
+        all_vars = imports_project.get_all_vars()
         assert 'sub.SUB_VAR' in all_vars
+    
+    def test_get_all_vars_is_cached(self, imports_project):
+        """Test that get_all_vars walks the imports only once."""
+        assert imports_project.get_all_vars() is imports_project.get_all_vars()
+    
+    def test_get_all_vars_refreshed_after_resolution(self, config_with_imports):
+        """Test that resolving variables again invalidates the cached variables."""
+        project = Project(config_with_imports)
+        project.get_all_vars()
+        project.vars['NEW_VAR'] = '${MAIN_VAR}'
+        project._Project__resolve_all_variables()
+        assert project.get_all_vars()['NEW_VAR'] == 'main_value'
+
+    
+    def test_get_all_rules_nested_imports_order(self, temp_dir):
+        """Test rules of nested imports are prefixed with each alias, in declaration order."""
+        for name, config in {
+            'leaf.yml': {'rules': {'leaf_rule': {'commands': []}}},
+            'mid.yml': {'imports': [{'path': 'leaf.yml', 'as': 'inner'}], 'rules': {'mid_rule': {'commands': []}}},
+            'other.yml': {'rules': {'other_rule': {'commands': []}}},
+            'build.yml': {
+                'imports': [{'path': 'mid.yml', 'as': 'middle'}, {'path': 'other.yml', 'as': 'extra'}],
+                'rules': {'main_rule': {'commands': []}},
+            },
+        }.items():
+            with open(os.path.join(temp_dir, name), 'w') as f:
+                yaml.dump(config, f, Dumper=YamlDumper)
+        project = Project(os.path.join(temp_dir, 'build.yml'))
+        assert list(project.get_all_rules()) == ['main_rule', 'middle.mid_rule', 'middle.inner.leaf_rule', 'extra.other_rule']
 
 
 class TestSummary:
     """Tests for project summary generation."""
     
-    def test_get_summary(self, basic_config):
+    def test_get_summary(self, basic_project):
         """Test getting project summary."""
-        project = Project(basic_config)
-        summary = project.get_summary()
+        summary = basic_project.get_summary()
         assert isinstance(summary, str)
         assert 'Project Configuration' in summary
         assert 'Variables' in summary
         assert 'Rules' in summary
         assert 'BUILD_DIR' in summary
     
-    def test_summary_includes_rules(self, basic_config):
+    def test_summary_includes_rules(self, basic_project):
         """Test that summary includes all rules."""
-        project = Project(basic_config)
-        summary = project.get_summary()
+        summary = basic_project.get_summary()
         assert 'compile' in summary
         assert 'test' in summary
     
-    def test_summary_with_imports(self, config_with_imports):
+    def test_summary_with_imports(self, imports_project):
         """Test summary includes imported projects."""
-        project = Project(config_with_imports)
-        summary = project.get_summary()
+        summary = imports_project.get_summary()
         assert 'sub_rule' in summary
 
 
 class TestVariablePriority:
     """Tests for variable priority levels."""
     
-    def test_config_file_vars_override_defaults(self, basic_config):
+    def test_config_file_vars_override_defaults(self, basic_project):
         """Test that config file vars override defaults."""
-        project = Project(basic_config)
         # PROJECT_DIR should be overridable via config
-        assert 'BUILD_DIR' in project.vars
-        assert project.vars['BUILD_DIR'] == 'build'
+        assert 'BUILD_DIR' in basic_project.vars
+        assert basic_project.vars['BUILD_DIR'] == 'build'
     
     def test_command_line_vars_have_highest_priority(self, basic_config):
         """Test that command line vars override everything."""
@@ -491,7 +725,7 @@ class TestVariablePriority:
         }
         config_file = os.path.join(temp_dir, 'build.yml')
         with open(config_file, 'w') as f:
-            yaml.dump(config, f)
+            yaml.dump(config, f, Dumper=YamlDumper)
         
         project = Project(config_file)
         # Builtin vars should override config vars
@@ -507,7 +741,7 @@ class TestEdgeCases:
         config = {'rules': {}}
         config_file = os.path.join(temp_dir, 'build.yml')
         with open(config_file, 'w') as f:
-            yaml.dump(config, f)
+            yaml.dump(config, f, Dumper=YamlDumper)
         
         project = Project(config_file)
         assert len(project.rules) == 0
@@ -527,37 +761,30 @@ class TestEdgeCases:
         }
         main_config_file = os.path.join(temp_dir, 'build.yml')
         with open(main_config_file, 'w') as f:
-            yaml.dump(main_config, f)
+            yaml.dump(main_config, f, Dumper=YamlDumper)
         
         with pytest.raises(ValueError, match='Import path is a directory'):
             Project(main_config_file)
     
-    def test_absolute_import_path(self, temp_dir):
+    def test_absolute_import_path(self, project_dir):
         """Test importing with absolute path."""
-        sub_dir = os.path.join(temp_dir, 'subproject')
-        os.makedirs(sub_dir, exist_ok=True)
-        
-        sub_config = {'vars': {}, 'rules': {}}
-        sub_config_file = os.path.join(sub_dir, 'build.yml')
-        with open(sub_config_file, 'w') as f:
-            yaml.dump(sub_config, f)
-        
         main_config = {
             'imports': [
-                {'path': sub_config_file},
+                {'path': os.path.join(project_dir, 'subproject', 'build.yml')},
             ],
             'vars': {},
             'rules': {}
         }
-        main_config_file = os.path.join(temp_dir, 'build.yml')
+        main_config_file = os.path.join(project_dir, 'build.yml')
         with open(main_config_file, 'w') as f:
-            yaml.dump(main_config, f)
+            yaml.dump(main_config, f, Dumper=YamlDumper)
         
         project = Project(main_config_file)
         assert len(project.imports) > 0
     
-    def test_variable_circular_reference(self, temp_dir):
+    def test_variable_circular_reference(self, temp_dir, monkeypatch):
         """Test handling of circular variable references."""
+        monkeypatch.setattr('builder.project.MAX_RESOLVE_ITER', 4)
         config = {
             'vars': {
                 'VAR1': '${VAR2}',
@@ -567,7 +794,7 @@ class TestEdgeCases:
         }
         config_file = os.path.join(temp_dir, 'build.yml')
         with open(config_file, 'w') as f:
-            yaml.dump(config, f)
+            yaml.dump(config, f, Dumper=YamlDumper)
         
         # Should not hang or crash, variables will eventually stabilize
         project = Project(config_file)
@@ -575,12 +802,22 @@ class TestEdgeCases:
         assert project.vars['VAR1'] in ('${VAR2}', '${VAR1}')
         assert project.vars['VAR2'] in ('${VAR1}', '${VAR2}')
     
+    def test_variable_growing_self_reference(self, temp_dir, monkeypatch):
+        """Test a value that grows at each substitution pass is given up on after MAX_RESOLVE_ITER passes."""
+        monkeypatch.setattr('builder.project.MAX_RESOLVE_ITER', 4)
+        config_file = os.path.join(temp_dir, 'build.yml')
+        with open(config_file, 'w') as f:
+            f.write("vars:\n  VAR: '${VAR}x'\nrules: {}\n")
+        
+        project = Project(config_file)
+        assert project.vars['VAR'] == '${VAR}xxxxx'
+    
     def test_config_with_no_rules(self, temp_dir):
         """Test config without rules section."""
         config = {'vars': {'TEST_VAR': 'test_value'}}
         config_file = os.path.join(temp_dir, 'build.yml')
         with open(config_file, 'w') as f:
-            yaml.dump(config, f)
+            yaml.dump(config, f, Dumper=YamlDumper)
         
         project = Project(config_file)
         assert len(project.rules) == 0
@@ -590,16 +827,21 @@ class TestEdgeCases:
 class TestRun:
     """Tests for running rules."""
     
-    @patch('builder.rule.Rule.execute')
-    def test_run_rules(self, mock_execute, basic_config):
+    @pytest.fixture(autouse=True)
+    def executed(self, monkeypatch):
+        """Replace Rule.execute, and return the (rule name, force) of each call."""
+        calls = []
+        monkeypatch.setattr(Rule, 'execute', lambda rule, force=False: calls.append((rule.name, force)))
+        return calls
+    
+    def test_run_rules(self, executed, basic_config):
         """Test running selected rules."""
         project = Project(basic_config)
         rules_to_run = {'compile': project.rules['compile']}
         project.run(rules_to_run)
-        mock_execute.assert_called_once()
+        assert executed == [('compile', False)]
     
-    @patch('builder.rule.Rule.execute')
-    def test_run_multiple_rules(self, mock_execute, basic_config):
+    def test_run_multiple_rules(self, executed, basic_config):
         """Test running multiple rules."""
         project = Project(basic_config)
         rules_to_run = {
@@ -607,12 +849,165 @@ class TestRun:
             'test': project.rules['test']
         }
         project.run(rules_to_run)
-        assert mock_execute.call_count == 2
+        assert len(executed) == 2
     
-    @patch('builder.rule.Rule.execute')
-    def test_run_with_force_flag(self, mock_execute, basic_config):
+    def test_run_with_force_flag(self, executed, basic_config):
         """Test running rules with force flag."""
         project = Project(basic_config)
         rules_to_run = {'compile': project.rules['compile']}
         project.run(rules_to_run, force=True)
-        mock_execute.assert_called_once_with(True)
+        assert executed == [('compile', True)]
+
+    
+    def test_run_clears_glob_cache(self, basic_config):
+        """Test patterns are expanded again for each run."""
+        project = Project(basic_config)
+        with patch('builder.project.glob_files') as mock_glob_files:
+            project.run({'compile': project.rules['compile']})
+        mock_glob_files.cache_clear.assert_called_once()
+
+class TestRunDependencies:
+    """Tests for running rules with dependencies."""
+    
+    @staticmethod
+    def _record_execution(calls, delay=0.0):
+        def execute(rule, force=False):
+            calls.append(('start', rule.name))
+            time.sleep(delay)
+            calls.append(('end', rule.name))
+        return execute
+    
+    def test_run_sequential_respects_dependencies(self, config_with_dependencies):
+        """Test rules run after their dependencies with a single job."""
+        project = Project(config_with_dependencies)
+        calls = []
+        with patch.object(Rule, 'execute', autospec=True, side_effect=self._record_execution(calls)):
+            project.run(project.select_rules([], []))
+        order = [name for event, name in calls if event == 'start']
+        assert order.index('compile') < order.index('link') < order.index('package')
+        assert order.index('docs') < order.index('package')
+    
+    def test_run_sequential_keeps_selection_order(self, basic_config):
+        """Test rules without dependencies run in selection order."""
+        project = Project(basic_config)
+        calls = []
+        with patch.object(Rule, 'execute', autospec=True, side_effect=self._record_execution(calls)):
+            project.run({'test': project.rules['test'], 'compile': project.rules['compile']})
+        assert [name for event, name in calls if event == 'start'] == ['test', 'compile']
+    
+    def test_run_ignores_unselected_dependencies(self, config_with_dependencies):
+        """Test dependencies outside the selection don't block a rule."""
+        project = Project(config_with_dependencies)
+        with patch.object(Rule, 'execute') as mock_execute:
+            project.run({'link': project.rules['link']})
+        mock_execute.assert_called_once()
+    
+    def test_run_implicit_dependency_on_files(self, temp_dir):
+        """Test a rule runs after the rule expecting one of its required files."""
+        config = {'rules': {
+            'link': {'required-files': ['${PROJECT_DIR}/main.o'], 'expected-files': ['${PROJECT_DIR}/app'], 'commands': []},
+            'compile': {'expected-files': ['${PROJECT_DIR}/main.o'], 'commands': []},
+        }}
+        config_file = os.path.join(temp_dir, 'build.yml')
+        with open(config_file, 'w') as f:
+            yaml.dump(config, f, Dumper=YamlDumper)
+        project = Project(config_file)
+        calls = []
+        with patch.object(Rule, 'execute', autospec=True, side_effect=self._record_execution(calls)):
+            project.run(project.select_rules([], []))
+        assert [name for event, name in calls if event == 'start'] == ['compile', 'link']
+    
+    def test_run_waits_for_every_producer_of_a_file(self, temp_dir):
+        """Test a rule requiring a file expected by several rules runs after all of them."""
+        config = {'rules': {
+            'package': {'required-files': ['${PROJECT_DIR}/out.txt'], 'commands': []},
+            'first': {'expected-files': ['${PROJECT_DIR}/out.txt'], 'commands': []},
+            'second': {'expected-files': ['${PROJECT_DIR}/out.txt'], 'commands': []},
+        }}
+        config_file = os.path.join(temp_dir, 'build.yml')
+        with open(config_file, 'w') as f:
+            yaml.dump(config, f, Dumper=YamlDumper, sort_keys=False)
+        project = Project(config_file)
+        graph = project._Project__dependency_graph(project.select_rules([], []))
+        assert graph['package'] == {'first', 'second'}
+    
+    @pytest.mark.parametrize('jobs', [1, 2])
+    def test_run_file_cycle_ignores_file_dependencies(self, temp_dir, jobs):
+        """Test rules depending on each other only through files still run, in selection order with a single job, with a warning."""
+        config = {'rules': {
+            'a': {'required-files': ['${PROJECT_DIR}/x'], 'expected-files': ['${PROJECT_DIR}/y'], 'commands': []},
+            'b': {'required-files': ['${PROJECT_DIR}/y'], 'expected-files': ['${PROJECT_DIR}/x'], 'commands': []},
+        }}
+        config_file = os.path.join(temp_dir, 'build.yml')
+        with open(config_file, 'w') as f:
+            yaml.dump(config, f, Dumper=YamlDumper)
+        project = Project(config_file)
+        calls = []
+        with patch.object(Rule, 'execute', autospec=True, side_effect=self._record_execution(calls)), \
+             patch('builder.project.Logger') as mock_logger:
+            project.run(project.select_rules([], []), jobs=jobs)
+        started = [name for event, name in calls if event == 'start']
+        assert started == ['a', 'b'] if jobs == 1 else sorted(started) == ['a', 'b']
+        mock_logger.warning.assert_called_once()
+    
+    def test_run_circular_dependency(self, temp_dir):
+        """Test circular dependencies are reported."""
+        config = {'rules': {
+            'a': {'depends-on': ['b'], 'commands': []},
+            'b': {'depends-on': ['a'], 'commands': []},
+        }}
+        config_file = os.path.join(temp_dir, 'build.yml')
+        with open(config_file, 'w') as f:
+            yaml.dump(config, f, Dumper=YamlDumper)
+        project = Project(config_file)
+        with patch.object(Rule, 'execute'):
+            with pytest.raises(ValueError, match='Circular dependency'):
+                project.run(project.rules)
+            with pytest.raises(ValueError, match='Circular dependency'):
+                project.run(project.rules, jobs=2)
+    
+    def test_run_parallel_respects_dependencies(self, config_with_dependencies):
+        """Test rules only start once their dependencies are done with several jobs."""
+        project = Project(config_with_dependencies)
+        calls = []
+        with patch.object(Rule, 'execute', autospec=True, side_effect=self._record_execution(calls, delay=0.01)):
+            project.run(project.select_rules([], []), jobs=4)
+        assert len(calls) == 8
+        assert calls.index(('end', 'compile')) < calls.index(('start', 'link'))
+        assert calls.index(('end', 'link')) < calls.index(('start', 'package'))
+        assert calls.index(('end', 'docs')) < calls.index(('start', 'package'))
+    
+    def test_run_parallel_serializes_colliding_rules(self, config_with_dependencies):
+        """Test rules sharing expected files don't run at the same time."""
+        project = Project(config_with_dependencies)
+        calls = []
+        rules = {name: project.rules[name] for name in ('docs', 'compile', 'link')}
+        with patch.object(Rule, 'execute', autospec=True, side_effect=self._record_execution(calls, delay=0.05)):
+            project.run(rules, jobs=4)
+        # docs and link both produce 'app'
+        docs_span = (calls.index(('start', 'docs')), calls.index(('end', 'docs')))
+        link_span = (calls.index(('start', 'link')), calls.index(('end', 'link')))
+        assert docs_span[1] < link_span[0] or link_span[1] < docs_span[0]
+    
+    def test_run_parallel_runs_independent_rules_concurrently(self, config_with_dependencies):
+        """Test independent rules overlap when several jobs are allowed."""
+        project = Project(config_with_dependencies)
+        calls = []
+        rules = {name: project.rules[name] for name in ('docs', 'compile')}
+        with patch.object(Rule, 'execute', autospec=True, side_effect=self._record_execution(calls, delay=0.05)):
+            project.run(rules, jobs=2)
+        assert [event for event, _ in calls[:2]] == ['start', 'start']
+    
+    def test_run_parallel_propagates_failure(self, config_with_dependencies):
+        """Test a failing rule stops scheduling and its error is raised."""
+        project = Project(config_with_dependencies)
+        started = []
+        def execute(rule, force=False):
+            started.append(rule.name)
+            if rule.name == 'compile':
+                raise RuntimeError('compile failed')
+        with patch.object(Rule, 'execute', autospec=True, side_effect=execute):
+            with pytest.raises(RuntimeError, match='compile failed'):
+                project.run(project.select_rules([], []), jobs=4)
+        assert 'link' not in started
+        assert 'package' not in started
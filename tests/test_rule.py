@@ -4,8 +4,7 @@ import os
 import tempfile
 import time
 from pathlib import Path
-from unittest.mock import MagicMock, patch
-from io import StringIO
+from unittest.mock import patch
 
 from builder.rule import Rule
 
@@ -64,6 +63,22 @@ class TestRuleInitialization:
         rule = Rule('no_tags_rule', config, basic_variables)
         assert rule.tags == []
     
+    def test_init_depends_on(self, basic_variables):
+        """Test depends-on is read as a list of rule names."""
+        config = {'depends-on': ['compile', 'generate'], 'commands': []}
+        rule = Rule('link', config, basic_variables)
+        assert rule.depends_on == ['compile', 'generate']
+    
+    def test_init_depends_on_single_name(self, basic_variables):
+        """Test depends-on accepts a single rule name."""
+        rule = Rule('link', {'depends-on': 'compile'}, basic_variables)
+        assert rule.depends_on == ['compile']
+    
+    def test_init_without_depends_on(self, basic_config, basic_variables):
+        """Test depends-on defaults to an empty list."""
+        rule = Rule('compile', basic_config, basic_variables)
+        assert rule.depends_on == []
+    
     def test_init_sets_name(self, basic_config, basic_variables):
         """Test name is correctly set."""
         rule = Rule('my_rule', basic_config, basic_variables)
@@ -91,6 +106,21 @@ class TestRuleInitialization:
         assert 'result.txt' in rule.expected_files
         assert 'output.log' in rule.expected_files
 
+    
+    def test_init_does_not_expand_files(self, basic_variables):
+        """Test that file patterns are only expanded when first accessed."""
+        config = {
+            'required-files': ['src/*.c'],
+            'expected-files': ['build/*.o'],
+            'commands': []
+        }
+        with patch('builder.rule.expand_files', return_value=[]) as mock_expand:
+            rule = Rule('lazy_rule', config, basic_variables)
+            assert mock_expand.call_count == 0
+            rule.required_files
+            rule.required_files
+            assert mock_expand.call_count == 1
+
 
 class TestFileGroupHandling:
     """Tests for file group handling in initialization."""
@@ -390,51 +420,6 @@ class TestCheckExpectedFiles:
         assert rule._Rule__check_expected_files() is True
 
 
-class TestGetLastEditedTime:
-    """Tests for getting last edited time."""
-    
-    def test_get_last_edited_time_required(self, temp_dir, basic_variables):
-        """Test getting last edit time of required files."""
-        file1 = os.path.join(temp_dir, 'file1.txt')
-        file2 = os.path.join(temp_dir, 'file2.txt')
-        
-        Path(file1).touch()
-        time.sleep(0.1)
-        Path(file2).touch()
-        
-        config = {
-            'required-files': [file1, file2],
-            'expected-files': [],
-            'commands': []
-        }
-        rule = Rule('time_rule', config, basic_variables)
-        last_time = rule._Rule__get_last_edited_time_required()
-        file2_time = os.path.getmtime(file2)
-        
-        # Should return the latest time (file2)
-        assert last_time == file2_time
-    
-    def test_get_last_edited_time_expected(self, temp_dir, basic_variables):
-        """Test getting last edit time of expected files."""
-        file1 = os.path.join(temp_dir, 'out1.txt')
-        file2 = os.path.join(temp_dir, 'out2.txt')
-        
-        Path(file1).touch()
-        time.sleep(0.1)
-        Path(file2).touch()
-        
-        config = {
-            'required-files': [],
-            'expected-files': [file1, file2],
-            'commands': []
-        }
-        rule = Rule('expect_time', config, basic_variables)
-        last_time = rule._Rule__get_last_edited_time_expected()
-        file2_time = os.path.getmtime(file2)
-        
-        assert last_time == file2_time
-
-
 class TestMustBeRerun:
     """Tests for determining if rule must be rerun."""
     
@@ -499,21 +484,41 @@ class TestMustBeRerun:
         }
         rule = Rule('newer_exp', config, basic_variables)
         assert rule._Rule__must_be_rerun() is False
+    
+    @staticmethod
+    def _files_with_mtimes(temp_dir, mtimes):
+        """Create the files, each one with the given modification time, and return their paths in order."""
+        paths = []
+        for name, mtime in mtimes.items():
+            path = os.path.join(temp_dir, name)
+            Path(path).touch()
+            os.utime(path, (mtime, mtime))
+            paths.append(path)
+        return paths
+    
+    def test_must_rerun_when_latest_required_newer_than_latest_expected(self, temp_dir, basic_variables):
+        """Test rerun when the newest required file is newer than every expected file, even if others are older."""
+        required = self._files_with_mtimes(temp_dir, {'in1.txt': 1000, 'in2.txt': 3000})
+        expected = self._files_with_mtimes(temp_dir, {'out1.txt': 2000, 'out2.txt': 2500})
+        config = {'required-files': required, 'expected-files': expected, 'commands': []}
+        rule = Rule('latest_req', config, basic_variables)
+        assert rule._Rule__must_be_rerun() is True
+    
+    def test_must_not_rerun_when_latest_expected_newest(self, temp_dir, basic_variables):
+        """Test no rerun when the newest expected file is newer than every required file, even if others are older."""
+        required = self._files_with_mtimes(temp_dir, {'in1.txt': 1000, 'in2.txt': 2000})
+        expected = self._files_with_mtimes(temp_dir, {'out1.txt': 1500, 'out2.txt': 3000})
+        config = {'required-files': required, 'expected-files': expected, 'commands': []}
+        rule = Rule('latest_exp', config, basic_variables)
+        assert rule._Rule__must_be_rerun() is False
 
 
 class TestExecuteCommands:
     """Tests for command execution."""
 
-    @patch('builder.command.sp.Popen')
-    def test_execute_commands_success(self, mock_popen, basic_variables, temp_dir):
+    @patch('builder.command.run_command')
+    def test_execute_commands_success(self, mock_run_command, basic_variables, temp_dir):
         """Test successful command execution."""
-        mock_process = MagicMock()
-        mock_process.poll.return_value = 0
-        mock_process.returncode = 0
-        mock_process.stdout = StringIO('')
-        mock_process.stderr = StringIO('')
-        mock_popen.return_value = mock_process
-        
         config = {
             'required-files': [],
             'expected-files': [],
@@ -522,18 +527,11 @@ class TestExecuteCommands:
         rule = Rule('exec_rule', config, basic_variables)
         rule._Rule__execute_commands()
         
-        mock_popen.assert_called_once()
+        mock_run_command.assert_called_once()
     
-    @patch('builder.command.sp.Popen')
-    def test_execute_multiple_commands(self, mock_popen, basic_variables):
+    @patch('builder.command.run_command')
+    def test_execute_multiple_commands(self, mock_run_command, basic_variables):
         """Test executing multiple commands."""
-        mock_process = MagicMock()
-        mock_process.poll.return_value = 0
-        mock_process.returncode = 0
-        mock_process.stdout = StringIO('')
-        mock_process.stderr = StringIO('')
-        mock_popen.return_value = mock_process
-        
         config = {
             'required-files': [],
             'expected-files': [],
@@ -542,19 +540,11 @@ class TestExecuteCommands:
         rule = Rule('multi_cmd', config, basic_variables)
         rule._Rule__execute_commands()
         
-        assert mock_popen.call_count == 3      
-    
-    @patch('os.chdir')
-    @patch('builder.command.sp.Popen')
-    def test_execute_commands_changes_directory(self, mock_popen, mock_chdir, basic_variables, temp_dir):
-        """Test that working directory is changed during execution."""
-        mock_process = MagicMock()
-        mock_process.poll.side_effect = [None, 0]
-        mock_process.returncode = 0
-        mock_process.stdout = StringIO('')
-        mock_process.stderr = StringIO('')
-        mock_popen.return_value = mock_process
-        
+        assert mock_run_command.call_count == 3      
+    
+    @patch('builder.command.run_command')
+    def test_execute_commands_uses_working_directory(self, mock_run_command, basic_variables, temp_dir):
+        """Test that commands are run in the rule's working directory."""
         custom_dir = os.path.join(temp_dir, 'custom')
         config = {
             'working-directory': custom_dir,
@@ -562,37 +552,28 @@ class TestExecuteCommands:
             'expected-files': [],
             'commands': ['echo "test"']
         }
-        rule = Rule('chdir_rule', config, basic_variables)
+        rule = Rule('cwd_rule', config, basic_variables)
         rule._Rule__execute_commands()
         
-        # Should change to custom_dir and back
-        assert mock_chdir.call_count >= 2
-    
-    @patch('os.chdir')
-    @patch('builder.command.sp.Popen')
-    def test_execute_commands_restores_directory(self, mock_popen, mock_chdir, basic_variables, temp_dir):
-        """Test that original directory is restored after execution."""
-        mock_process = MagicMock()
-        mock_process.poll.side_effect = [None, 0]
-        mock_process.returncode = 0
-        mock_process.stdout = StringIO('')
-        mock_process.stderr = StringIO('')
-        mock_popen.return_value = mock_process
-        
+        assert mock_run_command.call_args[0][2] == custom_dir
+    
+    @patch('builder.command.run_command')
+    def test_execute_commands_keeps_process_directory(self, mock_run_command, basic_variables, temp_dir):
+        """Test that the process working directory is left untouched."""
         config = {
             'working-directory': temp_dir,
             'required-files': [],
             'expected-files': [],
             'commands': ['echo "test"']
         }
-        rule = Rule('restore_rule', config, basic_variables)
+        rule = Rule('cwd_rule', config, basic_variables)
         
         original_dir = os.getcwd()
-        rule._Rule__execute_commands()
+        with patch('os.chdir') as mock_chdir:
+            rule._Rule__execute_commands()
         
-        # Last chdir call should restore original directory
-        last_chdir_arg = mock_chdir.call_args_list[-1][0][0]
-        assert last_chdir_arg == original_dir or original_dir is not None
+        mock_chdir.assert_not_called()
+        assert os.getcwd() == original_dir
 
 
 class TestExecute:
@@ -625,6 +606,85 @@ class TestExecute:
         mock_exec_cmd.assert_called_once()
 
 
+class TestCache:
+    """Tests for the content-addressed execution cache."""
+    
+    @pytest.fixture
+    def cached_rule(self, temp_dir, basic_variables):
+        """Create a rule copying input.txt to output.txt, with an up-to-date output."""
+        input_file = os.path.join(temp_dir, 'input.txt')
+        Path(input_file).write_text('content')
+        config = {
+            'required-files': [input_file],
+            'expected-files': [os.path.join(temp_dir, 'output.txt')],
+            'commands': ['cp input.txt output.txt'],
+        }
+        rule = Rule('copy', config, basic_variables)
+        rule.execute()
+        return rule
+    
+    def _touch_later(self, path):
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    
+    def test_execute_writes_cache_entry(self, cached_rule, temp_dir):
+        """Test a successful execution is recorded in the project cache directory."""
+        assert cached_rule.cache_dir == os.path.join(temp_dir, '.builder-cache')
+        assert len(os.listdir(cached_rule.cache_dir)) == 1
+    
+    @patch('builder.command.run_command')
+    def test_cache_hit_when_content_unchanged(self, mock_run_command, cached_rule, temp_dir):
+        """Test a touched but unchanged input does not rerun the commands."""
+        self._touch_later(os.path.join(temp_dir, 'input.txt'))
+        cached_rule.execute()
+        mock_run_command.assert_not_called()
+    
+    @patch('builder.command.run_command')
+    def test_cache_miss_when_content_changed(self, mock_run_command, cached_rule, temp_dir):
+        """Test a modified input reruns the commands."""
+        input_file = os.path.join(temp_dir, 'input.txt')
+        Path(input_file).write_text('new content')
+        self._touch_later(input_file)
+        cached_rule.execute()
+        mock_run_command.assert_called_once()
+    
+    @patch('builder.command.run_command')
+    def test_cache_miss_when_output_changed(self, mock_run_command, cached_rule, temp_dir):
+        """Test an expected file modified since the last run invalidates the cache."""
+        Path(os.path.join(temp_dir, 'output.txt')).write_text('edited')
+        self._touch_later(os.path.join(temp_dir, 'input.txt'))
+        cached_rule.execute()
+        mock_run_command.assert_called_once()
+    
+    def test_output_removed_during_lookup_is_a_miss(self, cached_rule, temp_dir):
+        """Test an expected file deleted after any existence check is a cache miss, not an error."""
+        key = cached_rule._Rule__cache_key()
+        os.remove(os.path.join(temp_dir, 'output.txt'))
+        with patch('os.path.exists', return_value=True): # the file still looked present when it was checked
+            assert cached_rule._Rule__is_cached(key) is False
+    
+    def test_cache_key_with_missing_required_file(self, cached_rule, temp_dir):
+        """Test the key is still computed, and differs, once a required file is gone."""
+        key = cached_rule._Rule__cache_key()
+        os.remove(os.path.join(temp_dir, 'input.txt'))
+        assert cached_rule._Rule__cache_key() != key
+    
+    @patch('builder.command.run_command')
+    def test_force_bypasses_cache(self, mock_run_command, cached_rule):
+        """Test force=True runs the commands even on a cache hit."""
+        cached_rule.execute(force=True)
+        mock_run_command.assert_called_once()
+    
+    @patch('builder.command.run_command')
+    def test_rule_without_expected_files_not_cached(self, mock_run_command, temp_dir, basic_variables):
+        """Test rules without expected files always run and write no cache entry."""
+        rule = Rule('always', {'commands': ['true']}, basic_variables)
+        rule.execute()
+        rule.execute()
+        assert mock_run_command.call_count == 2
+        assert not os.path.exists(rule.cache_dir)
+
+
 class TestEdgeCases:
     """Tests for edge cases and error conditions."""
     
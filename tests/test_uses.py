@@ -1,8 +1,10 @@
 import pytest
 import os
 import json
+import tomllib
 import tempfile
 from pathlib import Path
+from unittest.mock import patch
 
 from builder.uses import (
     load_project_file,
@@ -154,6 +156,7 @@ class TestIsProjectFile:
         """Test that partial filename matches are not accepted."""
         assert is_project_file('/path/to/myproject.toml') is False
         assert is_project_file('/path/to/package-lock.json') is False
+        assert is_project_file('/path/to/mypyproject.toml') is False
     
     def test_empty_string(self):
         """Test with empty string."""
@@ -172,6 +175,15 @@ class TestLoadProjectFile:
         assert result['name'] == 'test-project'
         assert result['version'] == '1.0.0'
     
+    def test_load_pyproject_toml_force(self, sample_pyproject):
+        """Test that forcing parses pyproject.toml again, even if it is cached."""
+        load_project_file(sample_pyproject)
+        with patch('builder.uses.tomllib.load', wraps=tomllib.load) as mock_load:
+            assert load_project_file(sample_pyproject)['name'] == 'test-project'
+            mock_load.assert_not_called()
+            assert load_project_file(sample_pyproject, force=True)['name'] == 'test-project'
+        mock_load.assert_called_once()
+    
     def test_load_package_json(self, sample_package_json):
         """Test loading package.json file."""
         result = load_project_file(sample_package_json)
@@ -1,17 +1,25 @@
 import pytest
 import os
+import pickle
+import sys
 import tempfile
 import time
 from pathlib import Path
+from unittest.mock import patch
 
 from builder.utils import (
     get_max_edit_time,
+    stat_many,
+    any_newer,
     files_exists,
     is_pattern,
     apply_variables,
     expand_files,
+    glob_files,
+    load_cached,
     flatten,
-    list2str
+    list2str,
+    _colors,
 )
 
 
@@ -96,6 +104,51 @@ class TestGetMaxEditTime:
         assert get_max_edit_time(nonexistent_files) == 0
 
 
+class TestStatMany:
+    """Tests for stat_many function."""
+    
+    def test_stat_existing_and_missing_files(self, temp_dir):
+        """Test existing files get their stat result and missing ones None."""
+        existing = os.path.join(temp_dir, 'exists.txt')
+        Path(existing).write_text('abc')
+        missing = os.path.join(temp_dir, 'missing.txt')
+        
+        stats = stat_many([existing, missing])
+        
+        assert stats[existing].st_size == 3
+        assert stats[missing] is None
+    
+    def test_each_file_stat_once(self, sample_files):
+        """Test a single stat call is made per file."""
+        with patch('builder.utils.os.stat', wraps=os.stat) as mock_stat:
+            get_max_edit_time(sample_files)
+        assert mock_stat.call_count == len(sample_files)
+
+
+class TestAnyNewer:
+    """Tests for any_newer function."""
+    
+    def test_any_newer_true(self, sample_files):
+        """Test a file edited after the threshold is found."""
+        threshold = os.path.getmtime(sample_files[0]) - 1
+        assert any_newer(sample_files, threshold) is True
+    
+    def test_any_newer_false(self, sample_files):
+        """Test no file is reported when all are older than the threshold."""
+        threshold = max(os.path.getmtime(f) for f in sample_files) + 1
+        assert any_newer(sample_files, threshold) is False
+    
+    def test_any_newer_ignores_missing_files(self, temp_dir):
+        """Test missing files are not considered newer."""
+        assert any_newer([os.path.join(temp_dir, 'missing.txt')], 0.0) is False
+    
+    def test_any_newer_stops_at_first_match(self, sample_files):
+        """Test the scan stops at the first newer file."""
+        with patch('builder.utils.os.stat', wraps=os.stat) as mock_stat:
+            assert any_newer(sample_files, 0.0) is True
+        assert mock_stat.call_count == 1
+
+
 class TestFilesExists:
     """Tests for files_exists function."""
     
@@ -255,6 +308,22 @@ class TestApplyVariables:
         result = apply_variables(value, variables)
         assert result == '/home/user/projects/myapp/src'
     
+    def test_substituted_value_not_rescanned(self):
+        """Test that references inside substituted values are not substituted again."""
+        value = '${A}'
+        variables = {'A': '${B}', 'B': 'b'}
+        
+        result = apply_variables(value, variables)
+        assert result == '${B}'
+    
+    def test_dotted_variable_name(self):
+        """Test substitution of imported (dotted) variable names."""
+        value = 'v${sub.VERSION}'
+        variables = {'sub.VERSION': '1.0'}
+        
+        result = apply_variables(value, variables)
+        assert result == 'v1.0'
+    
     def test_special_characters_in_value(self):
         """Test with special characters in variable values."""
         value = 'Command: ${CMD}'
@@ -263,6 +332,22 @@ class TestApplyVariables:
         result = apply_variables(value, variables)
         assert result == 'Command: echo "Hello | World"'
 
+    
+    def test_apply_variables_logs_once_per_value(self):
+        """Test substitutions are traced in a single log call per value."""
+        with patch('builder.utils.Logger') as mock_logger:
+            result = apply_variables('${A}/${B}/${A}', {'A': 'a', 'B': 'b'})
+        
+        assert result == 'a/b/a'
+        mock_logger.trace.assert_called_once()
+    
+    def test_apply_variables_without_reference_skips_regex(self):
+        """Test values without any reference are returned without being scanned by the regex."""
+        with patch('builder.utils.VAR_RE') as mock_re:
+            result = apply_variables('gcc -o main main.c', {'CC': 'clang'})
+        
+        assert result == 'gcc -o main main.c'
+        mock_re.sub.assert_not_called()
 
 class TestExpandFiles:
     """Tests for expand_files function."""
@@ -279,6 +364,22 @@ class TestExpandFiles:
         assert len(result) == 3
         assert all(f.endswith('.txt') for f in result)
     
+    def test_same_pattern_globbed_once(self, temp_dir):
+        """Test a pattern shared by several expansions walks the filesystem once."""
+        pattern = os.path.join(temp_dir, '**', '*.c')
+        with patch('builder.utils.glob.glob', return_value=['main.c']) as mock_glob:
+            assert expand_files([pattern]) == ['main.c']
+            assert expand_files([pattern]) == ['main.c']
+        mock_glob.assert_called_once_with(pattern, recursive=True)
+    
+    def test_glob_cache_clear_sees_new_files(self, temp_dir):
+        """Test clearing the glob cache picks up files created since."""
+        pattern = os.path.join(temp_dir, '*.log')
+        assert expand_files([pattern]) == []
+        Path(os.path.join(temp_dir, 'new.log')).touch()
+        glob_files.cache_clear()
+        assert len(expand_files([pattern])) == 1
+    
     def test_no_pattern_preserves_path(self, temp_dir):
         """Test that non-pattern paths are preserved."""
         file_path = os.path.join(temp_dir, 'file.txt')
@@ -468,6 +569,20 @@ class TestFlatten:
             'config.timeout': 30
         }
 
+    
+    def test_flatten_keeps_key_order(self):
+        """Test flattened keys keep the order of the nested dictionaries."""
+        dic = {'a': {'b': 1, 'c': {'d': 2}}, 'e': 3, 'f': {'g': 4}}
+        assert list(flatten(dic)) == ['a.b', 'a.c.d', 'e', 'f.g']
+    
+    def test_flatten_deep_nesting(self):
+        """Test deeply nested dictionaries don't hit the recursion limit."""
+        dic = current = {}
+        for _ in range(sys.getrecursionlimit() + 100):
+            current['k'] = current = {}
+        current['leaf'] = 'value'
+        result = flatten(dic)
+        assert list(result.values()) == ['value']
 
 class TestList2Str:
     """Tests for list2str function."""
@@ -541,6 +656,84 @@ class TestList2Str:
         assert result == 'a, None, b'
 
 
+class TestLoadCached:
+    """Tests for the on-disk cache of parsed files."""
+    
+    def test_parsed_once_across_runs(self, temp_dir):
+        """Test an unchanged file is read back from the cache instead of being parsed again."""
+        path = os.path.join(temp_dir, 'data.txt')
+        Path(path).write_text('content')
+        parse = lambda p: {'text': Path(p).read_text()}
+        assert load_cached(path, parse) == {'text': 'content'}
+        
+        with patch.object(Path, 'read_text') as mock_read:
+            assert load_cached(path, parse) == {'text': 'content'}
+        mock_read.assert_not_called()
+    
+    def test_parsed_again_when_modified(self, temp_dir):
+        """Test a modified file is parsed again."""
+        path = os.path.join(temp_dir, 'data.txt')
+        Path(path).write_text('old')
+        parse = lambda p: Path(p).read_text()
+        assert load_cached(path, parse) == 'old'
+        Path(path).write_text('newer')
+        assert load_cached(path, parse) == 'newer'
+    
+    def test_force_parses_again(self, temp_dir):
+        """Test the cache is ignored, and its entry refreshed, when forced."""
+        path = os.path.join(temp_dir, 'data.txt')
+        Path(path).write_text('content')
+        assert load_cached(path, lambda p: 'first') == 'first'
+        assert load_cached(path, lambda p: 'forced', force=True) == 'forced'
+        assert load_cached(path, lambda p: 'third') == 'forced'
+    
+    def test_cache_written_in_user_cache_dir(self, temp_dir, user_cache_dir):
+        """Test the entries are stored under the cache directory."""
+        path = os.path.join(temp_dir, 'data.txt')
+        Path(path).write_text('content')
+        load_cached(path, lambda p: 'parsed')
+        assert len(list((user_cache_dir / 'parsed').glob('*.pkl'))) == 1
+    
+    def test_corrupt_cache_entry_ignored(self, temp_dir, user_cache_dir):
+        """Test an unreadable entry falls back to parsing the file."""
+        path = os.path.join(temp_dir, 'data.txt')
+        Path(path).write_text('content')
+        load_cached(path, lambda p: 'parsed')
+        for entry in (user_cache_dir / 'parsed').glob('*.pkl'):
+            entry.write_bytes(b'not a pickle')
+        assert load_cached(path, lambda p: 'parsed again') == 'parsed again'
+    
+    def test_wrong_shape_cache_entry_ignored(self, temp_dir, user_cache_dir):
+        """Test a valid pickle that is not a (stamp, data) pair falls back to parsing the file."""
+        path = os.path.join(temp_dir, 'data.txt')
+        Path(path).write_text('content')
+        load_cached(path, lambda p: 'parsed')
+        for entry in (user_cache_dir / 'parsed').glob('*.pkl'):
+            entry.write_bytes(pickle.dumps(1))
+        assert load_cached(path, lambda p: 'parsed again') == 'parsed again'
+    
+    def test_unwritable_cache_dir(self, temp_dir, monkeypatch):
+        """Test files are still loaded when the cache can't be written."""
+        path = os.path.join(temp_dir, 'data.txt')
+        Path(path).write_text('content')
+        monkeypatch.setenv('XDG_CACHE_HOME', path) # a file, so no directory can be created under it
+        assert load_cached(path, lambda p: 'parsed') == 'parsed'
+
+
+class TestColors:
+    """Tests for the ANSI colour constants."""
+    
+    def test_colors_enabled_on_terminal(self):
+        """Test escape codes are used when stdout is a terminal."""
+        grey, red, green, yellow, reset = _colors(True)
+        assert red == '\033[31m'
+        assert reset == '\033[0m'
+    
+    def test_colors_disabled_when_not_a_terminal(self):
+        """Test no escape codes are emitted when stdout is redirected."""
+        assert _colors(False) == ('', '', '', '', '')
+
+
 class TestIntegration:
     """Integration tests combining multiple functions."""
     